@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Optional, Set, Tuple
+from rapidfuzz import fuzz, process
+
+from config import DEDUP_THRESHOLD
+
+# Scores only depend on the two titles, so the same pair coming back (an event seen
+# on every sync pass, or in both calendars) is answered from the cache
+@lru_cache(maxsize=4096)
+def similar(a: str, b: str, threshold: float = DEDUP_THRESHOLD) -> bool:
+	"""Return True if the two titles are at least `threshold` similar (0-1 scale)."""
+	if a is None or b is None:
+		return False
+	# The ratio can never exceed 1 - |len(a) - len(b)| / (len(a) + len(b)),
+	# so skip the matcher entirely when the lengths alone rule out a match
+	total = len(a) + len(b)
+	if total and abs(len(a) - len(b)) > (1 - threshold) * total:
+		return False
+	# Compare sorted tokens so reordered titles ("NYC Rust Meetup" vs "Rust NYC Meetup")
+	# still match. With a cutoff RapidFuzz bails out early and returns 0 for non-matches
+	cutoff = threshold * 100
+	return fuzz.token_sort_ratio(a, b, score_cutoff=cutoff) >= cutoff
+
+def similar_pairs(titles: List[str], existing_titles: List[str], threshold: float = DEDUP_THRESHOLD) -> Set[Tuple[str, str]]:
+	"""Score every incoming title against every existing title in one batch and
+	return the (title, existing title) pairs that are at least `threshold` similar."""
+	if not titles or not existing_titles:
+		return set()
+	# The whole matrix is computed in C on all cores, scores below the cutoff come back as 0
+	scores = process.cdist(
+		titles, existing_titles,
+		scorer=fuzz.token_sort_ratio,
+		score_cutoff=threshold * 100,
+		workers=-1
+	)
+	rows, cols = scores.nonzero()
+	return {(titles[row], existing_titles[col]) for row, col in zip(rows, cols)}
+
+def normalize_title(title: Optional[str]) -> str:
+	"""Normalize a title for comparison (case-insensitive, runs of whitespace collapsed)."""
+	return " ".join(str(title).casefold().split()) if title is not None else ""
+
+def to_utc(value) -> datetime:
+	"""Convert a DTSTART value (datetime or date) to an aware UTC datetime."""
+	if isinstance(value, datetime):
+		# Most times are already in UTC (parsed from ...Z), skip the conversion for those
+		if value.tzinfo is timezone.utc:
+			return value
+		return value.astimezone(timezone.utc)
+	return datetime.combine(value, datetime.min.time(), tzinfo=timezone.utc)
+
+def to_timestamp(value) -> int:
+	"""Convert a DTSTART value (datetime or date) to integer seconds since the epoch."""
+	return int(to_utc(value).timestamp())
@@ -0,0 +1,63 @@
+import aiohttp, re, time
+import logging
+from typing import Optional
+
+from event_source import request
+from _state import load_json, save_json
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+class HTTPCache:
+	"""Pages that rarely change, kept between runs together with their ETag and Last-Modified
+	validators. A page is only downloaded again once the server says it changed."""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._entries = load_json(path)
+		self._requested = set()
+
+	async def get(self, session: aiohttp.ClientSession, url: str, encoding: Optional[str] = None, **kwargs) -> Optional[str]:
+		"""GET a page and return its body, or None if the request failed. A copy that is still
+		fresh by its Cache-Control max-age is returned without asking the server. The body is
+		decoded with encoding if given, otherwise with the charset the server reports."""
+		self._requested.add(url)
+		entry = self._entries.get(url)
+		if entry and time.time() < entry.get("expires", 0):
+			return entry["body"]
+
+		headers = dict(kwargs.pop("headers", None) or {})
+		if entry and entry.get("etag"):
+			headers["If-None-Match"] = entry["etag"]
+		if entry and entry.get("last_modified"):
+			headers["If-Modified-Since"] = entry["last_modified"]
+
+		async with request(session, "GET", url, headers=headers, **kwargs) as response:
+			if response.status == 304 and entry:
+				body = entry["body"]
+			elif response.status == 200:
+				body = await response.text(encoding=encoding, errors="replace")
+			else:
+				logger.error("Request for %s failed with status %s", url, response.status)
+				return None
+
+			cache_control = response.headers.get("Cache-Control", "")
+			if "no-store" in cache_control:
+				self._entries.pop(url, None)
+				return body
+
+			# A 304 does not have to repeat the validators, so keep the ones we sent
+			max_age = _MAX_AGE_RE.search(cache_control)
+			self._entries[url] = {
+				"body": body,
+				"etag": response.headers.get("ETag") or (entry or {}).get("etag"),
+				"last_modified": response.headers.get("Last-Modified") or (entry or {}).get("last_modified"),
+				"expires": time.time() + int(max_age.group(1)) if max_age and "no-cache" not in cache_control else 0,
+			}
+			return body
+
+	def save(self):
+		"""Write the cached pages to disk for the next run, dropping those that were not
+		asked for this time so pages that went away do not pile up."""
+		save_json(self.path, {url: entry for url, entry in self._entries.items() if url in self._requested})
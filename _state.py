@@ -0,0 +1,38 @@
+import json, os, tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+def load_json(path: str) -> dict:
+	"""Load state saved by a previous run, or an empty dict if there is none."""
+	try:
+		with open(path) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+def save_json(path: str, data: dict):
+	try:
+		# Only our own user needs to read the cache
+		os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+		with open(path, "w") as f:
+			json.dump(data, f)
+	except OSError as e:
+		logger.warning("Could not save state to %s: %s", path, e)
+
+def save_secret(path: str, data: dict):
+	"""Save state holding a credential, readable by our own user only. It is written to a
+	private temp file first and moved into place, so it is never readable by others."""
+	directory = os.path.dirname(path)
+	try:
+		os.makedirs(directory, mode=0o700, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")  # created 0600
+		try:
+			with os.fdopen(fd, "w") as f:
+				json.dump(data, f)
+			os.replace(tmp_path, path)
+		except BaseException:
+			os.unlink(tmp_path)
+			raise
+	except OSError as e:
+		logger.warning("Could not save credentials to %s: %s", path, e)
@@ -1,20 +1,232 @@
-import caldav, hashlib
-from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+import asyncio, bisect, caldav, hashlib, os, re, time
+from dataclasses import astuple
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
 import logging, traceback
-from difflib import SequenceMatcher
+from functools import lru_cache
+from dateutil.rrule import rrulestr, rruleset
 from ics import Calendar as ICSCalendar
 from ics.event import Event as ICSEvent
+from caldav.elements import dav
+from caldav.lib import error as caldav_error
+from icalendar import Calendar as ICalendar, Event as VEvent
 
 from config import (
 	CALDAV_URL, CALDAV_USERNAME, CALDAV_PASSWORD,
-	CONFIRMED_CALENDAR, POSSIBLE_CALENDAR, DEDUP_THRESHOLD
+	CONFIRMED_CALENDAR, POSSIBLE_CALENDAR, DEDUP_THRESHOLD, CACHE_DIR,
+	SYNC_CONCURRENCY, SEEN_EVENTS_TTL
 )
 from event_source import Event
+from _dedup import normalize_title, similar, similar_pairs, to_timestamp, to_utc
+from _state import load_json, save_json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per calendar WebDAV-Sync token plus a local mirror of its events in the last sync window
+SYNC_STATE_FILE = os.path.join(CACHE_DIR, "tokens.json")
+# Changed calendar objects downloaded per calendar-multiget REPORT
+MULTIGET_BATCH = 100
+# Calendar name -> URL, so later runs can skip the calendar lookup
+CALENDAR_URLS_FILE = os.path.join(CACHE_DIR, "calendars.json")
+# Fingerprint -> expiry time of events synced by recent runs, kept for the current target only
+SEEN_EVENTS_FILE = os.path.join(CACHE_DIR, "seen.json")
+# Events synced to one server or pair of calendars still have to be written to another
+SEEN_EVENTS_TARGET = f"{CALDAV_URL} {CALDAV_USERNAME} {CONFIRMED_CALENDAR} {POSSIBLE_CALENDAR}"
+
+# Events starting further apart than this (in seconds) are never duplicates of each other
+DUPLICATE_WINDOW = 3600
+
+# Attribute of our Event -> iCalendar property it is stored in
+_EVENT_PROPERTIES = {
+	'title': 'summary',
+	'start_time': 'dtstart',
+	'end_time': 'dtend',
+	'description': 'description',
+	'location': 'location',
+	'url': 'url',
+}
+# Same for ics events, which are saved as is and so also keep their UID
+_ICS_EVENT_PROPERTIES = {
+	'name': 'summary',
+	'begin': 'dtstart',
+	'end': 'dtend',
+	'description': 'description',
+	'location': 'location',
+	'url': 'url',
+	'uid': 'uid',
+}
+
+def _normalize_value(value):
+	"""Normalize an event attribute or iCalendar property so both sides compare equal
+	when they describe the same thing (times in UTC, strings casefolded, None as "")."""
+	value = getattr(value, "dt", value)  # icalendar date/time property
+	value = getattr(value, "datetime", value)  # Arrow time from an ics event
+	if value is None:
+		return ""
+	if isinstance(value, (datetime, date)):
+		return to_utc(value)
+	return str(value).strip().casefold()
+
+def _event_status(event: Event) -> str:
+	"""The iCalendar STATUS an Event is saved with."""
+	if event.is_confirmed is None:
+		return "NEEDS-ACTION"
+	return "CONFIRMED" if event.is_confirmed else "TENTATIVE"
+
+def _as_list(value) -> list:
+	"""icalendar returns a single value or a list for properties that may repeat."""
+	if value is None:
+		return []
+	return value if isinstance(value, list) else [value]
+
+# UNTIL of an RRULE, as a date or a date-time that may or may not be in UTC
+_UNTIL_RE = re.compile(r"UNTIL=(\d{8})(T\d{6})?(Z?)")
+
+def _aware(value) -> datetime:
+	"""Make a DTSTART, EXDATE or UNTIL value an aware datetime, the way to_utc reads it:
+	dates as midnight UTC and floating times as local time. Zoned times are kept as they
+	are, so a series keeps its wall clock time across DST changes."""
+	if isinstance(value, datetime) and value.tzinfo is not None:
+		return value
+	return to_utc(value)
+
+def _utc_until(match: re.Match) -> str:
+	"""dateutil wants UNTIL in UTC once DTSTART is aware. A date UNTIL still includes
+	that whole day (RFC 5545 makes UNTIL inclusive)."""
+	if match.group(3):
+		return match.group(0)
+	return f"UNTIL={match.group(1)}{match.group(2) or 'T235959'}Z"
+
+@lru_cache(maxsize=256)
+def _recurrence(uid: str, dtstart, rules: Tuple[bytes, ...], exdates: Tuple) -> rruleset:
+	"""Build the occurrence set of a recurring master, cached per UID and rule so
+	each master is only parsed once however often its calendar is loaded."""
+	dtstart = _aware(dtstart)
+	occurrences = rruleset(cache=True)
+	for rule in rules:
+		occurrences.rrule(rrulestr(_UNTIL_RE.sub(_utc_until, rule.decode()), dtstart=dtstart))
+	for exdate in exdates:
+		occurrences.exdate(_aware(exdate))
+	return occurrences
+
+def _occurrences(component, start: datetime, end: datetime) -> List[int]:
+	"""Return the UTC start of every occurrence of a recurring master in the window.
+	A master whose rules cannot be expanded is treated as a single event at its DTSTART."""
+	dtstart = component.get("dtstart").dt
+	try:
+		occurrences = _recurrence(
+			str(component.get("uid")),
+			dtstart,
+			tuple(rule.to_ical() for rule in _as_list(component.get("rrule"))),
+			tuple(exdate.dt for prop in _as_list(component.get("exdate")) for exdate in prop.dts)
+		)
+		window = timedelta(seconds=DUPLICATE_WINDOW)
+		return [to_timestamp(occurrence) for occurrence in occurrences.between(start - window, end + window, inc=True)]
+	except (TypeError, ValueError) as e:
+		logger.warning(f"Could not expand recurring event '{component.get('summary')}': {str(e)}")
+		return [to_timestamp(dtstart)]
+
+def _digest(events: List[caldav.Event], window: Optional[Tuple[datetime, datetime]] = None) -> List[Tuple[str, int, caldav.Event]]:
+	"""Decode each CalDAV event once into (normalized summary, start timestamp, event) tuples.
+	Recurring events get a tuple per occurrence inside `window`.
+	Events without a start time are dropped since they can never match."""
+	digested = []
+	for existing in events:
+		component = existing.icalendar_component
+		dtstart = component.get("dtstart")
+		if dtstart is None:
+			continue  # Skip events without start time
+		summary = normalize_title(component.get("summary"))
+		if window is not None and component.get("rrule") is not None:
+			digested.extend((summary, occurrence, existing) for occurrence in _occurrences(component, *window))
+		else:
+			digested.append((summary, to_timestamp(dtstart.dt), existing))
+	return digested
+
+class _EventIndex:
+	"""Digested events of a calendar kept sorted by start time, so finding the
+	events around a given start is a bisect instead of a scan over the window."""
+
+	def __init__(self, digested: List[Tuple[str, int, caldav.Event]]):
+		self._entries = sorted(digested, key=lambda entry: entry[1])
+		self._starts = [entry[1] for entry in self._entries]
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def titles(self) -> Set[str]:
+		return {entry[0] for entry in self._entries}
+
+	def around(self, start: int, window: int = DUPLICATE_WINDOW) -> List[Tuple[str, int, caldav.Event]]:
+		"""Return the events starting within `window` seconds of the `start` timestamp."""
+		lo = bisect.bisect_left(self._starts, start - window)
+		hi = bisect.bisect_right(self._starts, start + window)
+		return self._entries[lo:hi]
+
+	def add(self, entry: Tuple[str, int, caldav.Event]):
+		i = bisect.bisect_right(self._starts, entry[1])
+		self._starts.insert(i, entry[1])
+		self._entries.insert(i, entry)
+
+	def remove(self, event: caldav.Event):
+		keep = [i for i, entry in enumerate(self._entries) if entry[2] is not event]
+		if len(keep) != len(self._entries):
+			self._entries = [self._entries[i] for i in keep]
+			self._starts = [self._starts[i] for i in keep]
+
+def _event_key(event) -> Tuple[str, int]:
+	"""Return the normalized title and start timestamp of an Event or ics event."""
+	if isinstance(event, ICSEvent):
+		return normalize_title(event.name), to_timestamp(event.begin.datetime)
+	return normalize_title(event.title), to_timestamp(event.start_time)
+
+def _item_start(item) -> Optional[datetime]:
+	"""Return the UTC start time of an Event or of the first event in an ICS calendar."""
+	if isinstance(item, Event):
+		return to_utc(item.start_time)
+	if isinstance(item, ICSCalendar):
+		for event in item.events:
+			return to_utc(event.begin.datetime)
+	return None
+
+def _fingerprint(item) -> Optional[str]:
+	"""Hash every synced field of an Event or of the first event in an ICS calendar,
+	so any change to the event gives it a new fingerprint."""
+	if isinstance(item, Event):
+		fields = astuple(item)
+	elif isinstance(item, ICSCalendar):
+		for event in item.events:
+			fields = (event.uid, event.name, event.begin, event.end, event.description, event.location, event.url, event.status)
+			break
+		else:
+			return None
+	else:
+		return None
+	return hashlib.blake2b("|".join(map(str, fields)).encode("utf-8"), digest_size=16).hexdigest()
+
+def _item_title(item) -> Optional[str]:
+	"""Return the normalized title of an Event or of the first event in an ICS calendar."""
+	if isinstance(item, Event):
+		return normalize_title(item.title)
+	if isinstance(item, ICSCalendar):
+		for event in item.events:
+			return normalize_title(event.name)
+	return None
+
+def _mirror(objects: Dict[str, dict], resources: List[caldav.CalendarObjectResource]):
+	"""Add downloaded calendar objects to a calendar's mirror in the sync state."""
+	for obj in resources:
+		if obj.data is None or "BEGIN:VEVENT" not in obj.data:
+			continue  # Deleted meanwhile, or not an event at all
+		component = obj.icalendar_component
+		dtstart = component.get("dtstart")
+		objects[str(obj.url)] = {
+			"data": obj.data,
+			"start": to_timestamp(dtstart.dt) if dtstart is not None else None,
+			"recurring": component.get("rrule") is not None,
+		}
+
 class CalendarSync:
 	def __init__(self):
 		self.client = caldav.DAVClient(
@@ -22,18 +234,56 @@ class CalendarSync:
 			username=CALDAV_USERNAME,
 			password=CALDAV_PASSWORD
 		)
-		self.principal = self.client.principal()
+		self._principal = None
+		self._calendars_by_name: Optional[Dict[str, caldav.Calendar]] = None
+		self._calendar_urls: Dict[str, str] = load_json(CALENDAR_URLS_FILE).get(CALDAV_URL, {})
 		self._confirmed_calendar = None
 		self._possible_calendar = None
+		# Digested events per calendar url, loaded once for the whole sync window
+		self._existing: Dict[str, _EventIndex] = {}
+		self._window: Optional[Tuple[datetime, datetime]] = None
+		self._sync_state = load_json(SYNC_STATE_FILE)
+		self._seen: Dict[str, float] = load_json(SEEN_EVENTS_FILE).get(SEEN_EVENTS_TARGET, {})
+		# Serializes writes against the same calendar while events sync concurrently
+		self._locks: Dict[str, asyncio.Lock] = {}
+		# Title pairs scored up front for the whole batch, see _score_titles
+		self._scored_titles: Set[str] = set()
+		self._scored_existing: Set[str] = set()
+		self._matching_titles: Set[Tuple[str, str]] = set()
+
+	@property
+	def principal(self) -> caldav.Principal:
+		if self._principal is None:
+			self._principal = self.client.principal()
+		return self._principal
 
 	def _get_or_create_calendar(self, calendar_name: str) -> caldav.Calendar:
 		"""Get or create a calendar with the given name."""
-		calendars = self.principal.calendars()
-		for calendar in calendars:
-			if calendar.name == calendar_name:
-				return calendar
-		
-		return self.principal.make_calendar(name=calendar_name)
+		# Known from a previous run, no need to ask the server
+		url = self._calendar_urls.get(calendar_name)
+		if url:
+			return caldav.Calendar(client=self.client, url=url, name=calendar_name)
+
+		# List the calendars once and answer every later lookup from the map
+		if self._calendars_by_name is None:
+			self._calendars_by_name = {calendar.name: calendar for calendar in self.principal.calendars()}
+		calendar = self._calendars_by_name.get(calendar_name)
+		if calendar is None:
+			calendar = self.principal.make_calendar(name=calendar_name)
+			self._calendars_by_name[calendar_name] = calendar
+
+		self._calendar_urls[calendar_name] = str(calendar.url)
+		save_json(CALENDAR_URLS_FILE, {CALDAV_URL: self._calendar_urls})
+		return calendar
+
+	def _refresh_calendars(self) -> Tuple[caldav.Calendar, caldav.Calendar]:
+		"""Forget the cached calendar URLs and listing and look both calendars up on the server again."""
+		logger.info("Calendar URLs are out of date, looking the calendars up again.")
+		self._calendar_urls.clear()
+		save_json(CALENDAR_URLS_FILE, {CALDAV_URL: self._calendar_urls})
+		self._calendars_by_name = None
+		self._confirmed_calendar = self._possible_calendar = None
+		return self.confirmed_calendar, self.possible_calendar
 
 	@property
 	def confirmed_calendar(self) -> caldav.Calendar:
@@ -47,108 +297,215 @@ class CalendarSync:
 			self._possible_calendar = self._get_or_create_calendar(POSSIBLE_CALENDAR)
 		return self._possible_calendar
 
+	def _sync_calendar(self, calendar: caldav.Calendar, start: datetime, end: datetime) -> List[caldav.Event]:
+		"""Update the local mirror of a calendar and return its events starting inside the
+		window. Parts of the window the mirror does not cover yet are filled with a windowed
+		search, after that a WebDAV-Sync (RFC 6578) report lists what changed since the stored
+		sync token and only those objects are downloaded, in calendar-multiget batches."""
+		url = str(calendar.url)
+		state = self._sync_state.get(url, {})
+		token = state.get("sync_token")
+		covered = state.get("window") if token else None
+		objects = dict(state.get("objects", {})) if covered else {}
+
+		changes = None
+		if covered:
+			try:
+				changes = calendar.objects_by_sync_token(sync_token=token)
+			except caldav_error.DAVError:
+				# The server no longer accepts our token (412), start over from a windowed search
+				logger.info(f"Sync token for {calendar.name} was rejected, loading it again.")
+				covered, objects = None, {}
+		if changes is None:
+			# Only lists hrefs and etags, the events themselves come from the search below
+			changes = calendar.objects_by_sync_token()
+		else:
+			# Deleted objects come back without an etag, changed ones are downloaded again
+			changed = []
+			for obj in changes:
+				objects.pop(str(obj.url), None)
+				if obj.props.get(dav.GetEtag.tag):
+					changed.append(obj.url)
+			for i in range(0, len(changed), MULTIGET_BATCH):
+				_mirror(objects, calendar.calendar_multiget(changed[i:i + MULTIGET_BATCH]))
+
+		start_ts, end_ts = start.timestamp(), end.timestamp()
+		gaps = [(start, end)]
+		if covered:
+			gaps = []
+			if start_ts < covered[0]:
+				gaps.append((start, datetime.fromtimestamp(covered[0], timezone.utc)))
+			if end_ts > covered[1]:
+				gaps.append((datetime.fromtimestamp(covered[1], timezone.utc), end))
+		for gap_start, gap_end in gaps:
+			_mirror(objects, calendar.search(start=gap_start, end=gap_end, event=True, expand=False))
+
+		# Only keep what the mirror covers from now on, earlier events are not asked for again.
+		# Recurring masters can start long before the window, _digest expands them
+		covered_to = max(end_ts, covered[1]) if covered else end_ts
+		objects = {
+			href: obj for href, obj in objects.items()
+			if obj["start"] is not None and (obj.get("recurring") or start_ts <= obj["start"] <= covered_to)
+		}
+		self._sync_state[url] = {"sync_token": changes.sync_token, "window": [start_ts, covered_to], "objects": objects}
+
+		return [
+			caldav.Event(client=self.client, url=href, data=obj["data"], parent=calendar)
+			for href, obj in objects.items()
+			if obj.get("recurring") or start_ts <= obj["start"] <= end_ts
+		]
+
+	def _load_calendar(self, calendar: caldav.Calendar, start: datetime, end: datetime) -> List[Tuple[str, int, caldav.Event]]:
+		"""Load the events of a calendar in the given window, incrementally through sync
+		tokens where the server supports it and with a single search otherwise.
+		Recurring events are expanded locally rather than by the server."""
+		try:
+			events = self._sync_calendar(calendar, start, end)
+		except Exception as e:
+			logger.warning(f"WebDAV-Sync failed for {calendar.name}, falling back to search: {str(e)}")
+			self._sync_state.pop(str(calendar.url), None)
+			events = calendar.search(
+				start=start,
+				end=end,
+				event=True,
+				expand=False
+			)
+		return _digest(events, (start, end))
+
+	async def _prefetch(self, start: datetime, end: datetime):
+		"""Load both calendars for the given window, fetching them in parallel."""
+		self._window = (start, end)
+		calendars = await asyncio.to_thread(lambda: (self.confirmed_calendar, self.possible_calendar))
+		try:
+			results = await asyncio.gather(*(
+				asyncio.to_thread(self._load_calendar, calendar, start, end) for calendar in calendars
+			))
+		except caldav_error.DAVError:
+			# A calendar was deleted or recreated since its URL was cached or listed, retry once
+			calendars = await asyncio.to_thread(self._refresh_calendars)
+			results = await asyncio.gather(*(
+				asyncio.to_thread(self._load_calendar, calendar, start, end) for calendar in calendars
+			))
+		for calendar, digested in zip(calendars, results):
+			self._existing[str(calendar.url)] = _EventIndex(digested)
+		await asyncio.to_thread(save_json, SYNC_STATE_FILE, self._sync_state)
+
+	async def _existing_events(self, calendar: caldav.Calendar, event_start: datetime) -> List[Tuple[str, int, caldav.Event]]:
+		"""Return the preloaded events of a calendar that start within an hour of `event_start`,
+		searching around it first if it falls outside the loaded window."""
+		url = str(calendar.url)
+		if (
+			url not in self._existing or
+			not self._window[0] + timedelta(hours=1) <= event_start <= self._window[1] - timedelta(hours=1)
+		):
+			await self._prefetch(event_start - timedelta(days=1), event_start + timedelta(days=1))
+		return self._existing[url].around(to_timestamp(event_start))
+
+	def _lock(self, calendar: caldav.Calendar) -> asyncio.Lock:
+		return self._locks.setdefault(str(calendar.url), asyncio.Lock())
+
+	def _forget(self, calendar: caldav.Calendar, existing: caldav.Event):
+		"""Drop a deleted event from the preloaded events of a calendar."""
+		index = self._existing.get(str(calendar.url))
+		if index is not None:
+			index.remove(existing)
+
+	def _remember(self, calendar: caldav.Calendar, saved: caldav.Event):
+		"""Add a newly saved event to the preloaded events of a calendar."""
+		index = self._existing.setdefault(str(calendar.url), _EventIndex([]))
+		for entry in _digest([saved], self._window):
+			index.add(entry)
+
+	def _score_titles(self, titles: List[str]):
+		"""Score the incoming titles against all preloaded titles in a single batch."""
+		self._scored_titles = set(titles)
+		self._scored_existing = set().union(*(index.titles() for index in self._existing.values()))
+		self._matching_titles = similar_pairs(list(self._scored_titles), list(self._scored_existing))
+
+	def _titles_similar(self, title: str, existing_title: str, threshold: float = DEDUP_THRESHOLD) -> bool:
+		"""Look the pair up in the batch scores, scoring it on the spot if it was not part
+		of the batch (events saved or searched during the sync, custom thresholds)."""
+		if threshold == DEDUP_THRESHOLD and title in self._scored_titles and existing_title in self._scored_existing:
+			return (title, existing_title) in self._matching_titles
+		return similar(title, existing_title, threshold)
+
 	def _event_to_ical(self, event: Event) -> str:
 		"""Convert our Event object to iCal format."""
 		# Ensure times are in UTC
-		start_time = event.start_time.astimezone(timezone.utc)
-		end_time = event.end_time.astimezone(timezone.utc)
-		
-		ical_template = f"""BEGIN:VCALENDAR
-VERSION:2.0
-BEGIN:VEVENT
-SUMMARY:{event.title}
-DTSTART:{start_time.strftime('%Y%m%dT%H%M%SZ')}
-DTEND:{end_time.strftime('%Y%m%dT%H%M%SZ')}
-"""
+		start_time = to_utc(event.start_time)
+		end_time = to_utc(event.end_time)
+
+		vevent = VEvent()
+		vevent.add("summary", event.title)
+		vevent.add("dtstart", start_time)
+		vevent.add("dtend", end_time)
+		# icalendar takes care of escaping and line folding
 		if event.description:
-			# Escape newlines and commas in description
-			description = event.description.replace('\n', '\\n').replace(',', '\\,')
-			ical_template += f"DESCRIPTION:{description}\n"
+			vevent.add("description", event.description)
 		if event.location:
-			# Escape newlines and commas in location
-			location = event.location.replace('\n', '\\n').replace(',', '\\,')
-			ical_template += f"LOCATION:{location}\n"
+			vevent.add("location", event.location)
 		if event.url:
-			ical_template += f"URL:{event.url}\n"
+			vevent.add("url", event.url)
 
-		if event.is_confirmed is not None:
-			ical_template += "STATUS:CONFIRMED\n" if event.is_confirmed else "STATUS:TENTATIVE\n"
-		else:
-			ical_template += "STATUS:NEEDS-ACTION\n"
+		vevent.add("status", _event_status(event))
 
 		# Add UID for uniqueness based on the event title and start time
 		if event.source_id:
-			ical_template += f"UID:{event.source_id}\n"
+			vevent.add("uid", event.source_id)
 		else:
 			# Fallback to a combination of title and start time if no source_id
 			# This is not ideal but ensures uniqueness
-			hash_out = hashlib.sha256().update(f"{event.title}_{start_time.isoformat()}".encode('utf-8'))
-			ical_template += f"UID:{hash_out.hexdigest()}\n"
+			hash_out = hashlib.sha256(f"{event.title}_{start_time.isoformat()}".encode('utf-8'))
+			vevent.add("uid", hash_out.hexdigest())
 
 		# Add creation date
-		ical_template += f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}\n"
+		vevent.add("dtstamp", datetime.now(timezone.utc))
 
 		#Add timezone information
-		ical_template += "X-WR-TIMEZONE:UTC\n"
+		vevent.add("x-wr-timezone", "UTC")
 		
 		# Add custom properties for source tracking
 		if event.source:
-			ical_template += f"X-EVENT-SOURCE:{event.source}\n"
+			vevent.add("x-event-source", event.source)
 		if event.source_id:
-			ical_template += f"X-SOURCE-ID:{event.source_id}\n"
+			vevent.add("x-source-id", event.source_id)
 
-		ical_template += """END:VEVENT
-END:VCALENDAR"""
-		return ical_template
+		calendar = ICalendar()
+		calendar.add("version", "2.0")
+		calendar.add_component(vevent)
+		return calendar.to_ical().decode("utf-8")
 
-	def _duplicate_events_ics(self, event: Event, existing_events: List[caldav.Event], threshold: float = DEDUP_THRESHOLD) -> bool:
+	def _duplicate_events_ics(self, event: ICSEvent, existing_events: List[Tuple[str, int, caldav.Event]], threshold: float = DEDUP_THRESHOLD) -> List[caldav.Event]:
 		duplicate_events = []
+		event_title, event_start = _event_key(event)
 
-		for existing in existing_events:
-			event_summary = existing.icalendar_component.get("summary")
-			dtstart = existing.icalendar_component.get("dtstart")
-			if dtstart is None:
-				continue  # Skip events without start time
-			event_time = dtstart.dt
-
-			# Ensure event_time is a datetime with timezone info
-			if isinstance(event_time, datetime):
-				event_time = event_time.astimezone(timezone.utc)
-			else:
-				event_time = datetime.combine(event_time, datetime.min.time(), tzinfo=timezone.utc)
+		for event_summary, event_time, existing in existing_events:
+			# Same event re-ingested from the same source, no need to score it
+			if event_title == event_summary and event_start == event_time:
+				duplicate_events.append(existing)
+				continue
 
 			if (
-				abs((event.begin - event_time).total_seconds()) < 3600 and
-				SequenceMatcher(None, event.name, event_summary).ratio() > threshold
+				abs(event_start - event_time) < DUPLICATE_WINDOW and
+				self._titles_similar(event_title, event_summary, threshold)
 			):
 				duplicate_events.append(existing)
 
 		return duplicate_events
 
-	def _duplicate_events(self, event: Event, existing_events: List[caldav.Event], threshold: float = DEDUP_THRESHOLD) -> bool:
+	def _duplicate_events(self, event: Event, existing_events: List[Tuple[str, int, caldav.Event]], threshold: float = DEDUP_THRESHOLD) -> List[caldav.Event]:
 		duplicate_events = []
-		for existing in existing_events:
-			event_summary = existing.icalendar_component.get("summary")
-			dtstart = existing.icalendar_component.get("dtstart")
-			if dtstart is None:
-				continue  # Skip events without start time
-			event_time = dtstart.dt
-			if isinstance(event, ICSEvent):
-				event_start = event.begin.astimezone(timezone.utc)
-				event_title = event.name
-			else:
-				event_start = event.start_time.astimezone(timezone.utc)
-				event_title = event.title
+		event_title, event_start = _event_key(event)
 
-			# Ensure event_time is a datetime with timezone info
-			if isinstance(event_time, datetime):
-				event_time = event_time.astimezone(timezone.utc)
-			else:
-				event_time = datetime.combine(event_time, datetime.min.time(), tzinfo=timezone.utc)
+		for event_summary, event_time, existing in existing_events:
+			# Same event re-ingested from the same source, no need to score it
+			if event_title == event_summary and event_start == event_time:
+				duplicate_events.append(existing)
+				continue
 
 			if (
-				abs((event_start - event_time).total_seconds()) < 3600 and
-				SequenceMatcher(None, event_title, event_summary).ratio() > threshold
+				abs(event_start - event_time) < DUPLICATE_WINDOW and
+				self._titles_similar(event_title, event_summary, threshold)
 			):
 				duplicate_events.append(existing)
 		
@@ -156,138 +513,97 @@ END:VCALENDAR"""
 	
 	def _event_properties_changed(self, event: Event, existing_event: caldav.Event) -> bool:
 		"""Check if any properties of the event have changed compared to the existing event."""
+		component = existing_event.icalendar_component
+		if component.get("rrule") is not None:
+			# Only one occurrence matched, replacing the master would delete the whole series
+			logger.info(f"'{component.get('summary')}' is a recurring event, leaving the series as it is.")
+			return False
 
 		#Check which event type we are dealing with
 		if isinstance(event, ICSEvent):
-			#print(existing_event.icalendar_component)
-			# For ICSEvent, we can directly compare the icalendar_component
-			dtstart = existing_event.icalendar_component.get("dtstart")
-			if dtstart is None:
-				return True  # Treat missing dtstart as a change
-			if event.begin != dtstart.dt:
-				logger.info(f"Start time has changed from {dtstart.dt} to {event.begin}.")
-				return True
-			dtend = existing_event.icalendar_component.get("dtend")
-			if dtend is None:
-				return True  # Treat missing dtend as a change
-			if event.end != dtend.dt:
-				logger.info(f"End time has changed from {dtend.dt} to {event.end}.")
-				return True
-			if event.name != existing_event.icalendar_component.get("summary"):
-				logger.info(f"Title has changed from {existing_event.icalendar_component.get('summary')} to {event.name}.")
-				return True
-			if event.description != existing_event.icalendar_component.get("description"):
-				logger.info(f"Description has changed from {existing_event.icalendar_component.get('description')} to {event.description}.")
-				return True
-			if event.location != existing_event.icalendar_component.get("location"):
-				logger.info(f"Location has changed from {existing_event.icalendar_component.get('location')} to {event.location}.")
-				return True
-			if event.url != existing_event.icalendar_component.get("url"):
-				logger.info(f"URL has changed from {existing_event.icalendar_component.get('url')} to {event.url}.")
-				return True
-			if event.status.upper() != existing_event.icalendar_component.get("status"):
-				logger.info(f"Confirmation status has changed from {existing_event.icalendar_component.get('status')} to {'CONFIRMED' if event.status.upper() == 'CONFIRMED' else 'TENTATIVE'}.")
-				return True
-			if event.uid != existing_event.icalendar_component.get("uid"):
-				logger.info(f"Source ID has changed from {existing_event.icalendar_component.get('uid')} to {event.source_id}.")
-				return True
-		elif isinstance(event, Event):
-			#print(event.__dict__)
-			# For Event, we need to check each property manually
-			if event.title != existing_event.icalendar_component.get("summary"):
-				logger.info(f"Title has changed from {existing_event.icalendar_component.get('summary')} to {event.title}.")
-				return True
-			dtstart = existing_event.icalendar_component.get("dtstart")
-			if dtstart is None:
-				return True  # Treat missing dtstart as a change
-			if event.start_time != dtstart.dt:
-				logger.info(f"Start time has changed from {dtstart.dt} to {event.start_time}.")
-				return True
-			dtend = existing_event.icalendar_component.get("dtend")
-			if dtend is None:
-				return True  # Treat missing dtend as a change
-			if event.end_time != dtend.dt:
-				logger.info(f"End time has changed from {dtend.dt} to {event.end_time}.")
-				return True
-			if event.description != existing_event.icalendar_component.get("description"):
-				logger.info(f"Description has changed from {existing_event.icalendar_component.get('description')} to {event.description}.")
-				return True
-			if event.location != existing_event.icalendar_component.get("location"):
-				logger.info(f"Location has changed from {existing_event.icalendar_component.get('location')} to {event.location}.")
-				return True
-			if event.url != existing_event.icalendar_component.get("url"):
-				logger.info(f"URL has changed from {existing_event.icalendar_component.get('url')} to {event.url}.")
-				return True
-			if event.is_confirmed != (existing_event.icalendar_component.get("status") == "CONFIRMED"):
-				logger.info(f"Confirmation status has changed from {existing_event.icalendar_component.get('status')} to {'CONFIRMED' if event.is_confirmed else 'TENTATIVE'}.")
-				return True
-		return False
-
-	def _remove_duplicate_events(self, event: Event, calendar: caldav.Calendar) -> int:
-		"""Remove all duplicate instances of the event from the given calendar.
-		Returns the number of events removed."""
-		count = 0
-		time_window = timedelta(days=1)
-
-		if isinstance(event, ICSEvent):
-			start = event.begin - time_window
-			end = event.begin + time_window
-			event_title = event.name
-			event_start = event.begin.astimezone(timezone.utc)
+			properties = _ICS_EVENT_PROPERTIES
+			status = (event.status or "").upper()
 		else:
-			start = event.start_time - time_window
-			end = event.start_time + time_window
-			event_title = event.title
-			event_start = event.start_time.astimezone(timezone.utc)
-		
-		# Search for potential duplicates
-		potential_duplicates = calendar.search(
-			start=start,
-			end=end,
-			event=True,
-			expand=True
-		)
+			properties = _EVENT_PROPERTIES
+			status = _event_status(event)
 
-		# Remove all duplicates
-		for existing in potential_duplicates:
-			event_summary = existing.icalendar_component.get("summary")
-			dtstart = existing.icalendar_component.get("dtstart")
-			if dtstart is None:
-				continue  # Skip events without start time
-			event_time = dtstart.dt
-			
-			# Ensure event_time is a datetime with timezone info
-			if isinstance(event_time, datetime):
-				event_time = event_time.astimezone(timezone.utc)
-			else:
-				event_time = datetime.combine(event_time, datetime.min.time(), tzinfo=timezone.utc)
-			
-			if (
-				abs((event_start - event_time).total_seconds()) < 3600 and
-				SequenceMatcher(None, event_title, event_summary).ratio() > DEDUP_THRESHOLD
-			):
-				try:
-					existing.delete()
-					count += 1
-				except Exception as e:
-					logger.error(f"Error deleting duplicate event '{event_summary}': {str(e)}")
-		
-		return count
+		for attribute, name in properties.items():
+			new, old = _normalize_value(getattr(event, attribute)), _normalize_value(component.get(name))
+			if new != old:
+				logger.info(f"{name.capitalize()} has changed from {old} to {new}.")
+				return True
 
-	async def sync(self, events):
-		"""Sync events to the appropriate calendars."""
+		if status != str(component.get("status", "")).upper():
+			logger.info(f"Confirmation status has changed from {component.get('status')} to {status}.")
+			return True
+		return False
+
+	async def _delete(self, calendar: caldav.Calendar, events: List[caldav.Event], title: str) -> bool:
+		"""Delete the given duplicates of an event from a calendar. Recurring masters are
+		kept, a single event only ever matches one of their occurrences.
+		Returns False if any of the others could not be removed."""
+		removed = True
 		for event in events:
-			#Check if event is Event object or Calendar object
-			if isinstance(event, Event):
-				await self.sync_event(event)
-			elif isinstance(event, ICSCalendar):
-				await self.sync_ics(event)
-			else:
-				logger.warning(f"Unsupported event type: {type(event)}. Skipping sync for this item.")
+			if event.icalendar_component.get("rrule") is not None:
+				logger.info(f"Keeping recurring event '{title}' in {calendar.name}, only one of its occurrences matches.")
 				continue
+			try:
+				await asyncio.to_thread(event.delete)
+				self._forget(calendar, event)
+				logger.info(f"Removed duplicate event '{title}' from {calendar.name}.")
+			except Exception as e:
+				logger.error(f"Error removing duplicate event '{title}' from {calendar.name}: {str(e)}")
+				removed = False
+		return removed
 
-	async def sync_ics(self, ics_object) :
-		"""Sync Calender ics object data to the calendars."""
+	async def sync(self, events):
+		"""Sync events to the appropriate calendars."""
+		events = list(events)
+
+		# Skip events that a recent run already synced unchanged
+		now = time.time()
+		self._seen = {fingerprint: expiry for fingerprint, expiry in self._seen.items() if expiry > now}
+		fingerprints = [_fingerprint(event) for event in events]
+		pending = [(event, fingerprint) for event, fingerprint in zip(events, fingerprints) if fingerprint not in self._seen]
+		if len(pending) < len(events):
+			logger.info(f"Skipping {len(events) - len(pending)} events that have not changed since the last sync")
+		events = [event for event, _ in pending]
+
+		# Load both calendars once for the whole batch instead of searching per event
+		starts = [start for start in map(_item_start, events) if start is not None]
+		if starts:
+			await self._prefetch(min(starts) - timedelta(days=1), max(starts) + timedelta(days=1))
+		titles = [title for title in map(_item_title, events) if title is not None]
+		await asyncio.to_thread(self._score_titles, titles)
+
+		# CalDAV calls run in worker threads, so several events can be in flight at once
+		semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+		self._locks = {}
+
+		async def sync_one(event):
+			async with semaphore:
+				#Check if event is Event object or Calendar object
+				if isinstance(event, Event):
+					return await self.sync_event(event)
+				elif isinstance(event, ICSCalendar):
+					return await self.sync_ics(event)
+				else:
+					logger.warning(f"Unsupported event type: {type(event)}. Skipping sync for this item.")
+					return False
+
+		results = await asyncio.gather(*(sync_one(event) for event in events), return_exceptions=True)
+		for (event, fingerprint), result in zip(pending, results):
+			if isinstance(result, Exception):
+				logger.error(f"Error syncing {event}: {str(result)}")
+			# Only skip events that actually made it, failed saves are retried next run
+			elif result is True and fingerprint is not None and SEEN_EVENTS_TTL > 0:
+				self._seen[fingerprint] = now + SEEN_EVENTS_TTL
+		# Entries for any other target are dropped, they would be stale by the time it is used again
+		await asyncio.to_thread(save_json, SEEN_EVENTS_FILE, {SEEN_EVENTS_TARGET: self._seen})
+
+	async def sync_ics(self, ics_object) -> bool:
+		"""Sync Calender ics object data to the calendars.
+		Returns False if a save or delete failed, so it is retried next run."""
 		#Check which calendar to sync to
 		event1 = None
 		for event in ics_object.events:
@@ -298,8 +614,9 @@ END:VCALENDAR"""
 		logger.info(f"Syncing event {event1.name} from ics object.")
 		
 		title = event1.name
-		start_time = event1.begin.astimezone(timezone.utc)
-		end_time = event1.end.astimezone(timezone.utc)
+		# Serialized once, every save below sends the same text
+		event_ics = event1.serialize()
+		start_time = to_utc(event1.begin.datetime)
 
 		if event1.status.upper() == 'CONFIRMED':
 			calendar = self.confirmed_calendar
@@ -308,86 +625,73 @@ END:VCALENDAR"""
 			calendar = self.possible_calendar
 			calendar2 = self.confirmed_calendar
 
-		#Check if event already exists in calendar
-		existing_events = calendar.search(
-			start=start_time - timedelta(days=1),
-			end=end_time + timedelta(days=1),
-			event=True,
-			expand=True
-		)
-
-		existing_events2 = calendar2.search(
-			start=start_time - timedelta(days=1),
-			end=end_time + timedelta(days=1),
-			event=True,
-			expand=True
-		)
-
-		logger.info(f"Found {len(existing_events)} existing events in {calendar.name} for '{title}'")
-		
-
-		#Remove all events that match the event from calendar2
-		duplicate_events = self._duplicate_events_ics(event1, existing_events2)
-		if len(duplicate_events) > 0:
-			logger.info(f"Removing Event '{title}' from the wrong calendar {calendar2.name}.")
-			for event in duplicate_events:
-				try:
-					event.delete()
-					logger.info(f"Removed duplicate event '{title}' from {calendar2.name}.")
-				except Exception as e:
-					logger.error(f"Error removing duplicate event '{title}' from {calendar2.name}: {str(e)}")
-
-		# Check to see if the event is already in the correct calendar
-		duplicate_events = self._duplicate_events_ics(event1, existing_events)
-		if len(duplicate_events) == 1:
-			logger.info(f"Event '{title}' already exists in {calendar.name}.")
-
-			#Do a check to see if any of the event details have changed
-			if self._event_properties_changed(event1, duplicate_events[0]):
-				logger.info(f"Event '{title}' has changed. Updating in {calendar.name}.")
-				#Remove the old event
-				self._remove_duplicate_events(event1, calendar)
-				# Add the updated event back
+		synced = True
+		async with self._lock(calendar2):
+			existing_events2 = await self._existing_events(calendar2, start_time)
+
+			#Remove all events that match the event from calendar2
+			duplicate_events = self._duplicate_events_ics(event1, existing_events2)
+			if len(duplicate_events) > 0:
+				logger.info(f"Removing Event '{title}' from the wrong calendar {calendar2.name}.")
+				if not await self._delete(calendar2, duplicate_events, title):
+					synced = False
+
+		async with self._lock(calendar):
+			existing_events = await self._existing_events(calendar, start_time)
+			logger.info(f"Found {len(existing_events)} existing events around '{title}' in {calendar.name}")
+
+			# Check to see if the event is already in the correct calendar
+			duplicate_events = self._duplicate_events_ics(event1, existing_events)
+			if len(duplicate_events) == 1:
+				logger.info(f"Event '{title}' already exists in {calendar.name}.")
+
+				#Do a check to see if any of the event details have changed
+				if self._event_properties_changed(event1, duplicate_events[0]):
+					logger.info(f"Event '{title}' has changed. Updating in {calendar.name}.")
+					#Remove the old event
+					if not await self._delete(calendar, duplicate_events, title):
+						synced = False
+					# Add the updated event back
+					try:
+						self._remember(calendar, await asyncio.to_thread(calendar.save_event, event_ics))
+						logger.info(f"Updated event '{title}' in {calendar.name}")
+					except Exception as e:
+						logger.error(f"Error updating event '{title}' in {calendar.name}: {str(e)}")
+						synced = False
+				else:
+					logger.info(f"Event '{title}' has not changed. No action needed in {calendar.name}.")
+					return synced
+			elif len(duplicate_events) > 1:
+				logger.warning(f"Multiple duplicate events found for '{title}' in {calendar.name}. This should not happen. Removing all duplicates.")
+				#Remove all duplicates
+				if not await self._delete(calendar, duplicate_events, title):
+					synced = False
+
+				#Add the event again
 				try:
-					calendar.save_event(event1.serialize())
-					logger.info(f"Updated event '{title}' in {calendar.name}")
+					logger.debug(f"Adding event '{event_ics}' to {calendar.name} after removing duplicates.")
+					self._remember(calendar, await asyncio.to_thread(calendar.save_event, event_ics))
+					logger.info(f"Added event '{title}' to {calendar.name} after removing duplicates.")
 				except Exception as e:
-					logger.error(f"Error updating event '{title}' in {calendar.name}: {str(e)}")
+					logger.error(f"Error adding event '{title}' to {calendar.name}: {str(e)}")
+					synced = False
 			else:
-				logger.info(f"Event '{title}' has not changed. No action needed in {calendar.name}.")
-				return
-		elif len(duplicate_events) > 1:
-			logger.warning(f"Multiple duplicate events found for '{title}' in {calendar.name}. This should not happen. Removing all duplicates.")
-			#Remove all duplicates
-			for event in duplicate_events:
+				logger.info(f"Event '{title}' does not exist in {calendar.name}. Adding it.")
+				# Add the event to the calendar
 				try:
-					event.delete()
-					logger.info(f"Removed duplicate event '{title}' from {calendar.name}.")
+					#logger.info(f"ics_object: {ics_object} {dir(ics_object)}")
+					logger.debug(f"Adding event '{event_ics}' to {calendar.name}.")
+					self._remember(calendar, await asyncio.to_thread(calendar.save_event, event_ics))
+					logger.info(f"Added event '{title}' to {calendar.name}")
 				except Exception as e:
-					logger.error(f"Error removing duplicate event '{title}' from {calendar.name}: {str(e)}")
-
-			#Add the event again
-			try:
-				logger.info(f"Adding event '{event1.serialize()}' to {ics_object.serialize()} after removing duplicates.")
-				calendar.save_event(event1.serialize())
-				logger.info(f"Added event '{title}' to {calendar.name} after removing duplicates.")
-			except Exception as e:
-				logger.error(f"Error adding event '{title}' to {calendar.name}: {str(e)}")
-		else:
-			logger.info(f"Event '{title}' does not exist in {calendar.name}. Adding it.")
-			# Add the event to the calendar
-			try:
-				#logger.info(f"ics_object: {ics_object} {dir(ics_object)}")
-				logger.info(f"Adding event '{event1.serialize()}' to {ics_object.serialize()}.")
-				calendar.save_event(event1.serialize())
-				logger.info(f"Added event '{title}' to {calendar.name}")
-			except Exception as e:
-				logger.error(f"Error adding event '{title}' to {calendar.name}: {str(e)}")
-				logger.error(traceback.format_exc())
-		
-
-	async def sync_event(self, event_object: Event):
-		"""Sync a single Event object to the appropriate calendar."""
+					logger.error(f"Error adding event '{title}' to {calendar.name}: {str(e)}")
+					logger.error(traceback.format_exc())
+					synced = False
+		return synced
+
+	async def sync_event(self, event_object: Event) -> bool:
+		"""Sync a single Event object to the appropriate calendar.
+		Returns False if a save or delete failed, so it is retried next run."""
 		#Check which calendar to sync to
 		if event_object.is_confirmed:
 			calendar = self.confirmed_calendar
@@ -396,76 +700,66 @@ END:VCALENDAR"""
 			calendar = self.possible_calendar
 			calendar2 = self.confirmed_calendar
 
-		#Check if event already exists in calendar
-		existing_events = calendar.search(
-			start=event_object.start_time - timedelta(days=1),
-			end=event_object.start_time + timedelta(days=1),
-			event=True,
-			expand=True
-		)
-
-		existing_events2 = calendar2.search(
-			start=event_object.start_time - timedelta(days=1),
-			end=event_object.start_time + timedelta(days=1),
-			event=True,
-			expand=True
-		)
-
-		#Remove all events that match the event from calendar2
-		duplicate_events = self._duplicate_events(event_object, existing_events2)
-		if len(duplicate_events) > 0:
-			logger.info(f"Removing Event '{event_object.title}' from the wrong calendar {calendar2.name}.")
-			for event in duplicate_events:
-				try:
-					event.delete()
-					logger.info(f"Removed duplicate event '{event_object.title}' from {calendar2.name}.")
-				except Exception as e:
-					logger.error(f"Error removing duplicate event '{event_object.title}' from {calendar2.name}: {str(e)}")
-
-		# Check to see if the event is already in the correct calendar
-		duplicate_events = self._duplicate_events(event_object, existing_events)
-		if len(duplicate_events) == 1:
-			logger.info(f"Event '{event_object.title}' already exists in {calendar.name}.")
-
-			#Do a check to see if any of the event details have changed
-			if self._event_properties_changed(event_object, duplicate_events[0]):
-				logger.info(f"Event '{event_object.title}' has changed. Updating in {calendar.name}.")
-				#Remove the old event
-				self._remove_duplicate_events(event_object, calendar)
-				# Add the updated event back
+		synced = True
+		async with self._lock(calendar2):
+			existing_events2 = await self._existing_events(calendar2, event_object.start_time)
+
+			#Remove all events that match the event from calendar2
+			duplicate_events = self._duplicate_events(event_object, existing_events2)
+			if len(duplicate_events) > 0:
+				logger.info(f"Removing Event '{event_object.title}' from the wrong calendar {calendar2.name}.")
+				if not await self._delete(calendar2, duplicate_events, event_object.title):
+					synced = False
+
+		async with self._lock(calendar):
+			#Check if event already exists in calendar
+			existing_events = await self._existing_events(calendar, event_object.start_time)
+
+			# Check to see if the event is already in the correct calendar
+			duplicate_events = self._duplicate_events(event_object, existing_events)
+			if len(duplicate_events) == 1:
+				logger.info(f"Event '{event_object.title}' already exists in {calendar.name}.")
+
+				#Do a check to see if any of the event details have changed
+				if self._event_properties_changed(event_object, duplicate_events[0]):
+					logger.info(f"Event '{event_object.title}' has changed. Updating in {calendar.name}.")
+					#Remove the old event
+					if not await self._delete(calendar, duplicate_events, event_object.title):
+						synced = False
+					# Add the updated event back
+					try:
+						ics_object = self._event_to_ical(event_object)
+						self._remember(calendar, await asyncio.to_thread(calendar.save_event, ics_object))
+						logger.info(f"Updated event '{event_object.title}' in {calendar.name}")
+					except Exception as e:
+						logger.error(f"Error updating event '{event_object.title}' in {calendar.name}: {str(e)}")
+						synced = False
+				else:
+					logger.info(f"Event '{event_object.title}' has not changed. No action needed in {calendar.name}.")
+					return synced
+			elif len(duplicate_events) > 1:
+				logger.warning(f"Multiple duplicate events found for '{event_object.title}' in {calendar.name}. This should not happen. Removing all duplicates.")
+				#Remove all duplicates
+				if not await self._delete(calendar, duplicate_events, event_object.title):
+					synced = False
+
+				#Add the event again
 				try:
 					ics_object = self._event_to_ical(event_object)
-					calendar.save_event(ics_object)
-					logger.info(f"Updated event '{event_object.title}' in {calendar.name}")
+					self._remember(calendar, await asyncio.to_thread(calendar.save_event, ics_object))
+					logger.info(f"Added event '{event_object.title}' to {calendar.name} after removing duplicates.")
 				except Exception as e:
-					logger.error(f"Error updating event '{event_object.title}' in {calendar.name}: {str(e)}")
+					logger.error(f"Error adding event '{event_object.title}' to {calendar.name}: {str(e)}")
+					synced = False
 			else:
-				logger.info(f"Event '{event_object.title}' has not changed. No action needed in {calendar.name}.")
-				return
-		elif len(duplicate_events) > 1:
-			logger.warning(f"Multiple duplicate events found for '{event_object.title}' in {calendar.name}. This should not happen. Removing all duplicates.")
-			#Remove all duplicates
-			for event in duplicate_events:
+				logger.info(f"Event '{event_object.title}' does not exist in {calendar.name}. Adding it.")
+				# Add the event to the calendar
 				try:
-					event.delete()
-					logger.info(f"Removed duplicate event '{event_object.title}' from {calendar.name}.")
+					ics_object = self._event_to_ical(event_object)
+					self._remember(calendar, await asyncio.to_thread(calendar.save_event, ics_object))
+					logger.info(f"Added event '{event_object.title}' to {calendar.name}")
 				except Exception as e:
-					logger.error(f"Error removing duplicate event '{event_object.title}' from {calendar.name}: {str(e)}")
-
-			#Add the event again
-			try:
-				ics_object = self._event_to_ical(event_object)
-				calendar.save_event(ics_object)
-				logger.info(f"Added event '{event_object.title}' to {calendar.name} after removing duplicates.")
-			except Exception as e:
-				logger.error(f"Error adding event '{event_object.title}' to {calendar.name}: {str(e)}")
-		else:
-			logger.info(f"Event '{event_object.title}' does not exist in {calendar.name}. Adding it.")
-			# Add the event to the calendar
-			try:
-				ics_object = self._event_to_ical(event_object)
-				calendar.save_event(ics_object)
-				logger.info(f"Added event '{event_object.title}' to {calendar.name}")
-			except Exception as e:
-				logger.error(f"Error adding event '{event_object.title}' to {calendar.name}: {str(e)}")
-				logger.error(traceback.format_exc())
\ No newline at end of file
+					logger.error(f"Error adding event '{event_object.title}' to {calendar.name}: {str(e)}")
+					logger.error(traceback.format_exc())
+					synced = False
+		return synced
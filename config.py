@@ -1,4 +1,6 @@
 import os
+from dataclasses import dataclass
+from types import MappingProxyType
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,31 +19,53 @@ POSSIBLE_CALENDAR = os.getenv('POSSIBLE_CALENDAR_NAME', 'Possible Events')
 MEETUP_API_KEY = os.getenv('MEETUP_API_KEY')
 
 # Event Sources Settings
-ENABLED_SOURCES = {
-	'meetup': True,
-	'partiful': True,
-	'eventbrite': True,
-	'nycsystems': True,
-}
+@dataclass(frozen=True, slots=True)
+class EnabledSources:
+	meetup: bool = True
+	partiful: bool = True
+	eventbrite: bool = True
+	nycsystems: bool = True
+
+ENABLED_SOURCES = EnabledSources(
+	meetup=True,
+	partiful=True,
+	eventbrite=True,
+	nycsystems=True,
+)
 
 # Eventbrite Configuration
-EVENTBRITE_ORGANIZER_IDS = [
+EVENTBRITE_ORGANIZER_IDS = (
 	"29377900795",  # Project Nutype
 	"86136754923",  # Lectures on Tap
 	# Add more organizer IDs here
-]
+)
 
 # Meetup Configuration
-MEETUP_GROUPS = [
+MEETUP_GROUPS = (
 	"fat-cat-fab-lab",
 	"new-york-c-c-meetup-group",
 	"papers-we-love",
 	"nycultimate",
 	"rust-nyc",
-	"hackmanhattan"
+	"hackmanhattan",
 	# Add more groups here
-]
+)
 
 # Sync Settings
 MAX_FUTURE_DAYS = 90     # How far into the future to fetch events
 DEDUP_THRESHOLD = 0.85   # Similarity threshold for deduplication
+SYNC_CONCURRENCY = 8     # How many events are synced to CalDAV at the same time
+FETCH_CONCURRENCY = 10   # How many requests a source has in flight at the same time
+SEEN_EVENTS_TTL = 24 * 60 * 60  # Seconds an unchanged event is skipped after it was synced (0 to always sync)
+MAX_RETRIES = 3          # How often a request is retried when the site answers 429 Too Many Requests
+MAX_RETRY_DELAY = 60     # Longest Retry-After (seconds) worth waiting for, a site asking for longer is given up on
+REQUEST_TIMEOUT = 15     # Seconds to wait for a connection or the next bytes of a response before giving up
+
+# Requests allowed per host as (requests, seconds), hosts without an entry are not limited
+RATE_LIMITS = MappingProxyType({
+	'meetup.com': (30, 10),
+	'eventbrite.com': (60, 60),
+})
+
+# Local cache for state kept between runs (CalDAV sync tokens, etc.)
+CACHE_DIR = os.path.expanduser(os.getenv('CAL_SYNC_CACHE_DIR', '~/.cache/cal_sync'))
@@ -1,9 +1,17 @@
+import aiohttp, asyncio
+import logging
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, List, Optional
 
-@dataclass
+from config import MAX_RETRIES, MAX_RETRY_DELAY
+
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
 class Event:
 	title: str
 	start_time: datetime
@@ -17,21 +25,58 @@ class Event:
 
 class EventSource(ABC):
 	"""Base class for all event sources."""
+	# Empty so subclasses can declare __slots__ of their own, those that don't still get a __dict__
+	__slots__ = ()
 	
 	@abstractmethod
-	async def fetch_events(self, days_ahead: int = 90) -> List[Event]:
+	async def iter_events(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> AsyncIterator[Event]:
 		"""
-		Fetch events from the source.
+		Yield events from the source as soon as they are parsed.
 		
 		Args:
+			session: HTTP session shared by all sources, so connections are reused
 			days_ahead: How many days into the future to fetch events for
 			
-		Returns:
-			List of Event objects
+		Yields:
+			Event objects
 		"""
 		pass
+
+	async def fetch_events(self, session: aiohttp.ClientSession, *args, **kwargs) -> List[Event]:
+		"""Collect everything iter_events() yields into a list, arguments are passed on to it."""
+		return [event async for event in self.iter_events(session, *args, **kwargs)]
 	
 	@abstractmethod
 	def name(self) -> str:
 		"""Return the name of this event source."""
-		pass 
\ No newline at end of file
+		pass
+
+def _retry_delay(response: aiohttp.ClientResponse, attempt: int) -> float:
+	"""Seconds to wait before retrying a 429, from Retry-After (seconds or an HTTP date)
+	or exponential backoff."""
+	retry_after = response.headers.get("Retry-After", "")
+	if retry_after.isdigit():
+		return float(retry_after)
+	try:
+		return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+	except (TypeError, ValueError):
+		return float(2 ** attempt)
+
+@asynccontextmanager
+async def request(session: aiohttp.ClientSession, method: str, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+	"""Like session.request(), but backs off and retries when the site answers 429."""
+	for attempt in range(MAX_RETRIES + 1):
+		response = await session.request(method, url, **kwargs)
+		if response.status != 429 or attempt == MAX_RETRIES:
+			break
+		delay = _retry_delay(response, attempt)
+		if delay > MAX_RETRY_DELAY:
+			# Waiting that long would hold up the whole sync, fail with the 429 instead
+			logger.warning("Rate limited by %s for %.0fs, not retrying", response.url.host, delay)
+			break
+		response.release()
+		logger.warning("Rate limited by %s, retrying in %.0fs", response.url.host, delay)
+		await asyncio.sleep(delay)
+
+	async with response:
+		yield response
@@ -1,11 +1,18 @@
-import asyncio, sys, os
+import aiohttp, asyncio
 import logging
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, List
+from aiolimiter import AsyncLimiter
 
-from config import ENABLED_SOURCES, MAX_FUTURE_DAYS
+try:
+	import uvloop
+except ImportError:
+	uvloop = None  # Not available on Windows, the default asyncio loop is used instead
+
+from config import ENABLED_SOURCES, MAX_FUTURE_DAYS, FETCH_CONCURRENCY, RATE_LIMITS, REQUEST_TIMEOUT
 from calendar_sync import CalendarSync
 from event_source import Event, EventSource
+from _dedup import normalize_title
 from sources.meetup import MeetupEventSource
 from sources.partiful import PartifulEventSource
 from sources.eventbrite import EventbriteEventSource
@@ -17,56 +24,122 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def _unique(events: list) -> list:
+	"""Drop repeated events, keeping the first one seen. An event is repeated when the same
+	source reports the same ID again, or when another source has an event with the same
+	title, location and start time (to the quarter hour)."""
+	unique = []
+	seen = set()
+	for event in events:
+		if isinstance(event, Event):
+			keys = [(normalize_title(event.title), normalize_title(event.location), int(event.start_time.timestamp()) // 900)]
+			if event.source_id:
+				keys.append((event.source, event.source_id))
+			if any(key in seen for key in keys):
+				continue
+			seen.update(keys)
+		unique.append(event)
+	return unique
+
 class EventAggregator:
 	def __init__(self):
 		self.sources: List[EventSource] = []
 		self.calendar_sync = CalendarSync()
+		self._limiters = {host: AsyncLimiter(rate, period) for host, (rate, period) in RATE_LIMITS.items()}
 		
 		# Initialize enabled sources
-		if ENABLED_SOURCES.get('meetup'):
+		if ENABLED_SOURCES.meetup:
 			self.sources.append(MeetupEventSource())
-		if ENABLED_SOURCES.get('partiful'):
-			self.sources.append(PartifulEventSource(ics_files=True))
-		if ENABLED_SOURCES.get('eventbrite'):
+		if ENABLED_SOURCES.partiful:
+			try:
+				self.sources.append(PartifulEventSource(ics_files=True))
+			except RuntimeError as e:
+				logger.error("Partiful is enabled but cannot be used: %s", e)
+		if ENABLED_SOURCES.eventbrite:
 			self.sources.append(EventbriteEventSource())
-		if ENABLED_SOURCES.get('nycsystems'):
+		if ENABLED_SOURCES.nycsystems:
 			self.sources.append(NYCSystemsEventSource())
 
-	async def fetch_all_events(self):
-		"""Fetch events from all enabled sources."""
-		all_events = []
-		
-		for source in self.sources:
-			try:
-				logger.info(f"Fetching events from {source.name()}")
-				events = await source.fetch_events(days_ahead=MAX_FUTURE_DAYS)
-				all_events.extend(events)
-				logger.info(f"Found {len(events)} events from {source.name()}")
-			except Exception as e:
-				logger.error(f"Error fetching events from {source.name()}: {str(e)}")
-		
-		return all_events
+	def _rate_limit(self) -> aiohttp.TraceConfig:
+		"""Make every request through the session wait for the rate limit of its host."""
+		async def on_request_start(session, context, params):
+			limiter = self._limiters.get(params.url.host.removeprefix("www."))
+			if limiter is not None:
+				await limiter.acquire()
+
+		trace_config = aiohttp.TraceConfig()
+		trace_config.on_request_start.append(on_request_start)
+		return trace_config
+
+	async def _fetch_one(self, session: aiohttp.ClientSession, source: EventSource, queue: asyncio.Queue):
+		"""Put the events of a single source on the queue as they arrive, then None once it is
+		done, logging instead of raising on errors."""
+		try:
+			logger.info("Fetching events from %s", source.name())
+			found = 0
+			async for event in source.iter_events(session, days_ahead=MAX_FUTURE_DAYS):
+				queue.put_nowait(event)
+				found += 1
+			logger.info("Found %s events from %s", found, source.name())
+		except Exception as e:
+			logger.error("Error fetching events from %s: %s", source.name(), e)
+		finally:
+			queue.put_nowait(None)
+
+	async def fetch_all_events(self, session: aiohttp.ClientSession) -> AsyncIterator:
+		"""Yield events from all enabled sources in the order they arrive."""
+		queue = asyncio.Queue()
+
+		# Sources are independent, so fetch them all at once
+		tasks = [asyncio.create_task(self._fetch_one(session, source, queue)) for source in self.sources]
+		try:
+			running = len(tasks)
+			while running:
+				event = await queue.get()
+				if event is None:
+					running -= 1
+					continue
+				yield event
+		finally:
+			for task in tasks:
+				task.cancel()
 
 	async def sync(self):
 		"""Main sync process."""
 		try:
-			# Fetch all events
-			events = await self.fetch_all_events()
-			logger.info(f"Found total of {len(events)} events")
+			# Fetch all events over one pool of keep-alive connections shared by every source
+			connector = aiohttp.TCPConnector(
+				limit=100,
+				limit_per_host=FETCH_CONCURRENCY,
+				ttl_dns_cache=300,
+				keepalive_timeout=75
+			)
+			# No total limit, it would also count the time requests spend waiting for the rate limiter
+			timeout = aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+			async with aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[self._rate_limit()]) as session:
+				# Matching runs over the whole batch, so the calendar sync starts once every source is done
+				events = [event async for event in self.fetch_all_events(session)]
+			logger.info("Found total of %s events", len(events))
+			# Sources finish in a different order every run, so sort by the order they are
+			# enabled in to keep the same copy of an event listed on several sites
+			order = {source.name(): index for index, source in enumerate(self.sources)}
+			events.sort(key=lambda event: order.get(getattr(event, "source", None), len(order)))
+			events = _unique(events)
+			logger.info("%s events left after removing repeats", len(events))
 			
 			# Sync to calendar
 			await self.calendar_sync.sync(events)			
 			logger.info("Sync completed successfully")
 			
-		except Exception as e:
-			logger.error(f"Error during sync: {str(e)}")
-			exc_type, exc_obj, exc_tb = sys.exc_info()
-			fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-			print(exc_type, fname, exc_tb.tb_lineno)
+		except Exception:
+			logger.exception("Error during sync")
 
 async def main():
 	aggregator = EventAggregator()
 	await aggregator.sync()
 
 if __name__ == "__main__":
-	asyncio.run(main()) 
\ No newline at end of file
+	if uvloop is not None:
+		uvloop.run(main())
+	else:
+		asyncio.run(main())
@@ -1,23 +1,54 @@
-import aiohttp
+import aiohttp, asyncio, functools
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 import logging
-import json
+import ijson
+import orjson
 import re
 import zoneinfo
 
-from event_source import EventSource, Event
-from config import EVENTBRITE_ORGANIZER_IDS
+from event_source import EventSource, Event, request
+from config import EVENTBRITE_ORGANIZER_IDS, FETCH_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
+# State embedded in organizer pages, found in the raw bytes to skip decoding the page
+_SERVER_DATA_MARKER = b"window.__SERVER_DATA__"
+# JSON strings (so braces inside them are skipped) and braces
+_JSON_TOKEN_RE = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}]', re.DOTALL)
+
+def _server_data(raw: bytes) -> Optional[bytes]:
+	"""Return the JSON object assigned to window.__SERVER_DATA__, found with a single linear
+	scan that matches braces outside of strings instead of a backtracking regex."""
+	start = raw.find(_SERVER_DATA_MARKER)
+	if start < 0:
+		return None
+	start = raw.find(b"{", start + len(_SERVER_DATA_MARKER))
+	if start < 0:
+		return None
+	depth = 0
+	for token in _JSON_TOKEN_RE.finditer(raw, start):
+		if token.group() == b"{":
+			depth += 1
+		elif token.group() == b"}":
+			depth -= 1
+			if depth == 0:
+				return raw[start:token.end()]
+	return None
+
+@functools.lru_cache(maxsize=None)
+def _get_tz(name: str) -> zoneinfo.ZoneInfo:
+	"""Look each timezone up once, most events share the same few."""
+	return zoneinfo.ZoneInfo(name)
+
 class EventbriteEventSource(EventSource):
 	API_URL = "https://www.eventbrite.com/api/v3/destination/events/"
+	PAGE_SIZE = 50  # Most events the details API returns for one request
 	
 	def name(self) -> str:
 		return "eventbrite"
 
-	async def _get_event_ids_from_organizer(self, session: aiohttp.ClientSession, organizer_id: str) -> List[str]:
+	async def _get_event_ids_from_organizer(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, organizer_id: str) -> List[str]:
 		"""Get event IDs from an organizer's page."""
 		event_ids = []
 		try:
@@ -26,26 +57,29 @@ class EventbriteEventSource(EventSource):
 				"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 			}
 			
-			async with session.get(url, headers=headers) as response:
+			async with semaphore, request(session, "GET", url, headers=headers) as response:
 				if response.status == 200:
-					text = await response.text()
+					raw = await response.read()
 					# Find the SERVER_DATA JSON
-					match = re.search(r'window\.__SERVER_DATA__\s*=\s*({.*?});', text, re.DOTALL)
-					if match:
-						data = json.loads(match.group(1))
-						# Extract event IDs from the events list
-						events = data.get("view_data", {}).get("events", {})
-						future_events = events.get("future_events", [])
-						event_ids.extend(str(event["id"]) for event in future_events)
+					server_data = _server_data(raw)
+					if server_data:
+						# Stream just the event IDs out of the blob instead of building the whole tree
+						event_ids.extend(str(event_id) for event_id in ijson.items(server_data, "view_data.events.future_events.item.id"))
 				else:
-					logger.error(f"Failed to fetch organizer page {organizer_id}: {response.status}")
+					logger.error("Failed to fetch organizer page %s: %s", organizer_id, response.status)
 		except Exception as e:
-			logger.error(f"Error getting event IDs from organizer {organizer_id}: {str(e)}")
+			logger.error("Error getting event IDs from organizer %s: %s", organizer_id, e)
 		
 		return event_ids
 
 	async def _get_events_details(self, session: aiohttp.ClientSession, event_ids: List[str]) -> List[Dict]:
-		"""Get detailed event information from the API."""
+		"""Get detailed event information from the API, one request per page of IDs."""
+		chunks = [event_ids[i:i + self.PAGE_SIZE] for i in range(0, len(event_ids), self.PAGE_SIZE)]
+		results = await asyncio.gather(*(self._fetch_chunk(session, chunk) for chunk in chunks), return_exceptions=True)
+		return [event for result in results if not isinstance(result, BaseException) for event in result]
+
+	async def _fetch_chunk(self, session: aiohttp.ClientSession, event_ids: List[str]) -> List[Dict]:
+		"""Get detailed event information for up to PAGE_SIZE events."""
 		if not event_ids:
 			return []
 			
@@ -53,7 +87,7 @@ class EventbriteEventSource(EventSource):
 			params = {
 				"event_ids": ",".join(event_ids),
 				"expand": "event_sales_status,image,primary_venue,saves,series,ticket_availability,primary_organizer",
-				"page_size": "50",
+				"page_size": str(self.PAGE_SIZE),
 				"include_parent_events": "true"
 			}
 			
@@ -65,136 +99,141 @@ class EventbriteEventSource(EventSource):
 				"Accept-Encoding": "gzip, deflate, br"
 			}
 
-			async with session.get(self.API_URL, params=params, headers=headers) as response:
+			async with request(session, "GET", self.API_URL, params=params, headers=headers) as response:
 				if response.status == 200:
-					data = await response.json()
+					data = await response.json(loads=orjson.loads)
 					return data.get("events", [])
 				else:
-					logger.error(f"Failed to fetch event details: {response.status}")
+					logger.error("Failed to fetch event details: %s", response.status)
 					response_text = await response.text()
-					logger.error(f"Response: {response_text}")
+					logger.error("Response: %s", response_text)
 		except Exception as e:
-			logger.error(f"Error getting event details: {str(e)}")
+			logger.error("Error getting event details: %s", e)
 		
 		return []
 
 	def _parse_datetime(self, date: str, time: str, timezone_str: str) -> datetime:
 		"""Parse date and time strings into a timezone-aware datetime object."""
 		try:
-			# Combine date and time strings
-			datetime_str = f"{date}T{time}"
-			# Parse into datetime object
-			dt = datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M")
+			# Parse the combined date and time (fromisoformat is C code, unlike strptime)
+			dt = datetime.fromisoformat(f"{date}T{time}")
 			# Attach timezone
-			tz = zoneinfo.ZoneInfo(timezone_str)
-			dt = dt.replace(tzinfo=tz)
+			dt = dt.replace(tzinfo=_get_tz(timezone_str))
 			# Convert to UTC
 			return dt.astimezone(timezone.utc)
 		except Exception as e:
-			logger.error(f"Error parsing datetime {date} {time} {timezone_str}: {str(e)}")
+			logger.error("Error parsing datetime %s %s %s: %s", date, time, timezone_str, e)
 			raise ValueError(f"Invalid datetime format: {date} {time}")
 
-	async def fetch_events(self, days_ahead: int = 360) -> List[Event]:
-		"""Fetch events from Eventbrite API."""
-		events = []
+	def _location(self, event_data: Dict) -> Optional[str]:
+		"""Join the venue name and address of an event, None if it has no venue."""
+		venue = event_data.get("primary_venue") or {}
+		address = (venue.get("address") or {}).get("localized_address_display")
+		return ", ".join(part for part in (venue.get("name"), address) if part) or None
+
+	def _from_recurring(self, event_data: Dict, next_dates: List[Dict]) -> Iterator[Event]:
+		"""Yield an Event for each upcoming date of a recurring event series."""
+		# Shared by every occurrence of the series
+		title = event_data["name"]
+		description = event_data.get("summary", "")
+		location = self._location(event_data)
+		url = event_data.get("url")
+
+		# Process each date in the series
+		for date_info in next_dates:
+			try:
+				# Parse start and end times (already in UTC)
+				start_time = datetime.fromisoformat(date_info["start"].replace("Z", "+00:00"))
+				end_time = datetime.fromisoformat(date_info["end"].replace("Z", "+00:00"))
+
+				logger.debug("Event data: %s %s %s", title, start_time, end_time)
+
+				# Create Event object for this occurrence
+				yield Event(
+					title=title,
+					start_time=start_time,
+					end_time=end_time,
+					description=description,
+					location=location,
+					url=url,
+					# Consider event confirmed if it's live/started and not cancelled
+					is_confirmed=False,
+					source=self.name(),
+					source_id=str(date_info["id"])  # Use the specific occurrence ID
+				)
+				
+			except (KeyError, ValueError) as e:
+				logger.error("Error parsing recurring event date: %s", e)
+				continue
+
+	def _from_single(self, event_data: Dict, now: datetime, max_date: datetime) -> Iterator[Event]:
+		"""Yield the Event for a non-recurring event if it starts inside the date range."""
+		timezone_str = event_data.get("timezone", "America/New_York")
+		start_time = self._parse_datetime(
+			event_data["start_date"],
+			event_data["start_time"],
+			timezone_str
+		)
+		
+		# Skip if outside our date range
+		if start_time < now or start_time > max_date:
+			return
+		
+		end_time = self._parse_datetime(
+			event_data["end_date"],
+			event_data["end_time"],
+			timezone_str
+		)
+
+		# Create Event object
+		yield Event(
+			title=event_data["name"],
+			start_time=start_time,
+			end_time=end_time,
+			description=event_data.get("summary", ""),
+			location=self._location(event_data),
+			url=event_data.get("url"),
+			is_confirmed=False,
+			source=self.name(),
+			source_id=str(event_data["id"])
+		)
+
+	async def iter_events(self, session: aiohttp.ClientSession, days_ahead: int = 360) -> AsyncIterator[Event]:
+		"""Yield events from Eventbrite API."""
 		now = datetime.now(timezone.utc)
 		max_date = now + timedelta(days=days_ahead)
 		
-		async with aiohttp.ClientSession() as session:
-			# First get all event IDs from organizers
-			all_event_ids = []
-			for organizer_id in EVENTBRITE_ORGANIZER_IDS:
-				event_ids = await self._get_event_ids_from_organizer(session, organizer_id)
-				all_event_ids.extend(event_ids)
-			
-			# Then get detailed event information
-			event_details = await self._get_events_details(session, all_event_ids)
+		# First get all event IDs from organizers, loading a few organizer pages at a time
+		all_event_ids = []
+		semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+		results = await asyncio.gather(
+			*(self._get_event_ids_from_organizer(session, semaphore, organizer_id) for organizer_id in EVENTBRITE_ORGANIZER_IDS),
+			return_exceptions=True
+		)
+		for organizer_id, result in zip(EVENTBRITE_ORGANIZER_IDS, results):
+			if isinstance(result, BaseException):
+				logger.error("Error getting event IDs from organizer %s: %s", organizer_id, result)
+				continue
+			all_event_ids.extend(result)
+		
+		# Then get detailed event information
+		event_details = await self._get_events_details(session, all_event_ids)
 
-			#logger.info(f"event_details: {event_details}")
-			
-			# Process events
-			for event_data in event_details:
-				try:
-					# Check if this is a recurring event series
-					series = event_data.get("series", {})
-					#logger.info(f"event_data: {event_data}")
-					if series and series.get("next_dates"):
-						# Process each date in the series
-						for date_info in series["next_dates"]:
-							try:
-								# Parse start and end times (already in UTC)
-								start_time = datetime.fromisoformat(date_info["start"].replace("Z", "+00:00"))
-								end_time = datetime.fromisoformat(date_info["end"].replace("Z", "+00:00"))
-
-								logger.info(f"Event data: {event_data.get('name')} {start_time} {end_time}")
-								
-								# Get venue information
-								venue = event_data.get("primary_venue", {})
-								location = None
-								if venue:
-									location = f"{venue.get('name', '')}, {venue.get('address', {}).get('localized_address_display', '')}"
-									location = location.strip(", ")  # Remove extra commas and spaces
-
-								# Create Event object for this occurrence
-								event = Event(
-									title=event_data["name"],
-									start_time=start_time,
-									end_time=end_time,
-									description=event_data.get("summary", ""),
-									location=location,
-									url=event_data.get("url"),
-									# Consider event confirmed if it's live/started and not cancelled
-									is_confirmed=False,
-									source=self.name(),
-									source_id=str(date_info["id"])  # Use the specific occurrence ID
-								)
-								events.append(event)
-								
-							except (KeyError, ValueError) as e:
-								logger.error(f"Error parsing recurring event date: {str(e)}")
-								continue
-					else:
-						# Handle non-recurring events
-						timezone_str = event_data.get("timezone", "America/New_York")
-						start_time = self._parse_datetime(
-							event_data["start_date"],
-							event_data["start_time"],
-							timezone_str
-						)
-						
-						# Skip if outside our date range
-						if start_time < now or start_time > max_date:
-							continue
-						
-						end_time = self._parse_datetime(
-							event_data["end_date"],
-							event_data["end_time"],
-							timezone_str
-						)
-
-						# Get venue information
-						venue = event_data.get("primary_venue", {})
-						location = None
-						if venue:
-							location = f"{venue.get('name', '')}, {venue.get('address', {}).get('localized_address_display', '')}"
-							location = location.strip(", ")
-
-						# Create Event object
-						event = Event(
-							title=event_data["name"],
-							start_time=start_time,
-							end_time=end_time,
-							description=event_data.get("summary", ""),
-							location=location,
-							url=event_data.get("url"),
-							is_confirmed=False,
-							source=self.name(),
-							source_id=str(event_data["id"])
-						)
-						events.append(event)
-					
-				except (KeyError, ValueError) as e:
-					logger.error(f"Error parsing Eventbrite event: {str(e)}")
-					continue
-
-		return events 
\ No newline at end of file
+		#logger.info(f"event_details: {event_details}")
+		
+		# Process events
+		for event_data in event_details:
+			try:
+				# Check if this is a recurring event series
+				series = event_data.get("series") or {}
+				#logger.info(f"event_data: {event_data}")
+				if series.get("next_dates"):
+					occurrences = self._from_recurring(event_data, series["next_dates"])
+				else:
+					occurrences = self._from_single(event_data, now, max_date)
+				for event in occurrences:
+					yield event
+				
+			except (KeyError, ValueError) as e:
+				logger.error("Error parsing Eventbrite event: %s", e)
+				continue
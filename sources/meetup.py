@@ -1,17 +1,77 @@
-import aiohttp, traceback, re
+import aiohttp, asyncio, os, time, re
+import orjson
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 import logging
 from pprint import pprint
-from event_source import EventSource, Event
-from config import MEETUP_GROUPS
+from event_source import EventSource, Event, request
+from config import MEETUP_GROUPS, FETCH_CONCURRENCY, CACHE_DIR
+from _state import load_json, save_json
 
 logger = logging.getLogger(__name__)
 
+# Patterns for finding the persisted query hash in Meetup's frontend bundles
+_SCRIPT_SRC_RE = re.compile(r'<script[^>]*src="([^"]*\.js[^"]*)"')
+_OPERATION_NAME = b"getUpcomingGroupEvents"
+# Bytes allowed between the parts of a match, bounded so a match has a maximum length
+_HASH_GAP = 2048
+_HASH_RE = re.compile(rb'"getUpcomingGroupEvents"[^}]{0,%d}"sha256Hash":"([a-f0-9]{64})"' % _HASH_GAP)
+_HASH_RE_ALT = re.compile(rb'getUpcomingGroupEvents[^}]{0,%d}persistedQuery[^}]{0,%d}([a-f0-9]{64})' % (_HASH_GAP, _HASH_GAP))
+# A match ending in a new chunk starts at most this far before it (longer than either pattern)
+_MATCH_OVERLAP = len(_OPERATION_NAME) + 2 * _HASH_GAP + 128
+# Only this many bundles from the homepage are searched for the hash
+MAX_BUNDLES = 8
+
+# Last query hash known to work, trusted without probing for QUERY_HASH_MAX_AGE seconds
+QUERY_HASH_FILE = os.path.join(CACHE_DIR, "meetup_hash.json")
+QUERY_HASH_MAX_AGE = 24 * 60 * 60
+
+def _hash_not_found(data: dict) -> bool:
+	"""Whether a GraphQL response says the persisted query hash is unknown."""
+	return any("PersistedQueryNotFound" in str(error) for error in data.get("errors", []))
+
 class MeetupEventSource(EventSource):
 	GQL_URL = "https://www.meetup.com/gql2"
 	QUERY_HASH = "01a34de668955a5b6307d23391a403d4e7e11668473da7bd42b6fd15d779a6bd"
 
+	async def _search_bundle(self, session: aiohttp.ClientSession, script_url: str) -> Optional[str]:
+		"""Stream a JavaScript bundle and return the query hash as soon as it shows up in it."""
+		try:
+			async with session.get(script_url) as js_response:
+				if js_response.status != 200:
+					return None
+				buffer = bytearray()
+				operation_at = -1
+				searched_to = 0
+				async for chunk in js_response.content.iter_chunked(65536):
+					buffer += chunk
+					# Only run the hash patterns once the operation name has been seen
+					if operation_at < 0:
+						operation_at = buffer.find(_OPERATION_NAME, max(0, len(buffer) - len(chunk) - len(_OPERATION_NAME)))
+						if operation_at < 0:
+							continue
+						# _HASH_RE starts at the quote before the name
+						operation_at = max(0, operation_at - 1)
+
+					# Earlier chunks were searched already, only rescan as far back as a match can reach
+					search_from = max(operation_at, searched_to - _MATCH_OVERLAP)
+					searched_to = len(buffer)
+
+					# Look for getUpcomingGroupEvents with hash pattern
+					hash_match = _HASH_RE.search(buffer, search_from)
+					if hash_match:
+						logger.info("Discovered new query hash: %s", hash_match.group(1).decode())
+						return hash_match.group(1).decode()
+
+					# Alternative pattern - look for the hash directly
+					hash_match = _HASH_RE_ALT.search(buffer, search_from)
+					if hash_match:
+						logger.info("Discovered new query hash (pattern 2): %s", hash_match.group(1).decode())
+						return hash_match.group(1).decode()
+		except Exception as e:
+			logger.debug("Error checking script %s: %s", script_url, e)
+		return None
+
 	async def _discover_query_hash(self, session: aiohttp.ClientSession) -> Optional[str]:
 		"""Attempt to discover the current query hash from Meetup's frontend."""
 		try:
@@ -22,52 +82,48 @@ class MeetupEventSource(EventSource):
 				html = await response.text()
 			
 			# Look for script tags with webpack bundles
-			script_urls = re.findall(r'<script[^>]*src="([^"]*\.js[^"]*)"', html)
-			
-			# Try to find the hash in JavaScript files
-			for script_url in script_urls:
-				if not script_url.startswith('http'):
-					script_url = f"https://www.meetup.com{script_url}"
-				
-				try:
-					async with session.get(script_url) as js_response:
-						if js_response.status == 200:
-							js_content = await js_response.text()
-							# Look for getUpcomingGroupEvents with hash pattern
-							hash_match = re.search(r'"getUpcomingGroupEvents"[^}]*"sha256Hash":"([a-f0-9]{64})"', js_content)
-							if hash_match:
-								logger.info(f"Discovered new query hash: {hash_match.group(1)}")
-								return hash_match.group(1)
-							
-							# Alternative pattern - look for the hash directly
-							hash_match = re.search(r'getUpcomingGroupEvents[^}]*persistedQuery[^}]*([a-f0-9]{64})', js_content)
-							if hash_match:
-								logger.info(f"Discovered new query hash (pattern 2): {hash_match.group(1)}")
-								return hash_match.group(1)
-				except Exception as e:
-					logger.debug(f"Error checking script {script_url}: {e}")
-					continue
+			script_urls = [
+				script_url if script_url.startswith('http') else f"https://www.meetup.com{script_url}"
+				for script_url in _SCRIPT_SRC_RE.findall(html)
+			]
+
+			# Search the first bundles in parallel and take the first hash found
+			tasks = [asyncio.create_task(self._search_bundle(session, script_url)) for script_url in script_urls[:MAX_BUNDLES]]
+			try:
+				for next_done in asyncio.as_completed(tasks):
+					query_hash = await next_done
+					if query_hash:
+						return query_hash
+			finally:
+				for task in tasks:
+					task.cancel()
 		
 		except Exception as e:
-			logger.error(f"Error discovering query hash: {e}")
+			logger.error("Error discovering query hash: %s", e)
 		
 		return None
 
-	async def _get_query_hash(self, session: aiohttp.ClientSession) -> str:
+	async def _get_query_hash(self, session: aiohttp.ClientSession, use_cache: bool = True) -> str:
 		"""Get the query hash, trying to auto-discover if the current one fails."""
+		cached = load_json(QUERY_HASH_FILE)
+		current_hash = cached.get("hash") or self.QUERY_HASH
+		if use_cache and cached.get("hash") and time.time() - cached.get("checked_at", 0) < QUERY_HASH_MAX_AGE:
+			return current_hash  # Checked recently, no need to probe
+
 		# First try the current hash
 		test_query = {
 			"operationName": "getUpcomingGroupEvents",
 			"variables": {"urlname": "test", "first": 1},
-			"extensions": {"persistedQuery": {"version": 1, "sha256Hash": self.QUERY_HASH}}
+			"extensions": {"persistedQuery": {"version": 1, "sha256Hash": current_hash}}
 		}
 		
 		try:
 			async with session.post(self.GQL_URL, json=test_query) as response:
 				if response.status == 200:
-					data = await response.json()
-					if "errors" not in data or not any("PersistedQueryNotFound" in str(error) for error in data.get("errors", [])):
-						return self.QUERY_HASH  # Current hash still works
+					data = await response.json(loads=orjson.loads)
+					if not _hash_not_found(data):
+						save_json(QUERY_HASH_FILE, {"hash": current_hash, "checked_at": time.time()})
+						return current_hash  # Current hash still works
 		except:
 			pass
 		
@@ -75,7 +131,8 @@ class MeetupEventSource(EventSource):
 		logger.warning("Current query hash may be outdated, attempting to discover new one...")
 		new_hash = await self._discover_query_hash(session)
 		if new_hash:
-			logger.info(f"Consider updating QUERY_HASH to: {new_hash}")
+			logger.info("Consider updating QUERY_HASH to: %s", new_hash)
+			save_json(QUERY_HASH_FILE, {"hash": new_hash, "checked_at": time.time()})
 			return new_hash
 		
 		logger.warning("Could not discover new hash, using existing one")
@@ -87,111 +144,144 @@ class MeetupEventSource(EventSource):
 	def _parse_datetime(self, date_str: str) -> datetime:
 		"""Parse datetime string and ensure it's timezone-aware."""
 		try:
-			# Remove 'Z' and add UTC timezone
-			if date_str.endswith('Z'):
-				date_str = date_str[:-1] + '+00:00'
-			# Parse the string to datetime
+			# Parse the string to datetime, fromisoformat accepts a trailing 'Z' since 3.11
 			dt = datetime.fromisoformat(date_str)
 			# If the datetime is naive, make it UTC
 			if dt.tzinfo is None:
 				dt = dt.replace(tzinfo=timezone.utc)
 			return dt
 		except Exception as e:
-			logger.error(f"Error parsing datetime {date_str}: {str(e)}")
+			logger.error("Error parsing datetime %s: %s", date_str, e)
 			raise ValueError(f"Invalid datetime format: {date_str}")
 
-	async def fetch_events(self, days_ahead: int = 90) -> List[Event]:
-		"""Fetch events from Meetup.com GraphQL API."""
+	async def _fetch_group(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, group: str, query_hash: str, now: datetime, max_date: datetime) -> List[Event]:
+		"""Fetch the upcoming events of a single Meetup group."""
 		events = []
-		now = datetime.now(timezone.utc)
-		max_date = now + timedelta(days=days_ahead)
-		
-		async with aiohttp.ClientSession() as session:
-			# Get the current query hash, auto-discovering if needed
-			current_hash = await self._get_query_hash(session)
-			
-			for group in MEETUP_GROUPS:
-				try:
-					# Prepare the GraphQL query
-					query_data = {
-						"operationName": "getUpcomingGroupEvents",
-						"variables": {
-							"urlname": group,
-							"afterDateTime": now.isoformat(),
-							"first": 50  # Limit to 50 events per group
-						},
-						"extensions": {
-							"persistedQuery": {
-								"version": 1,
-								"sha256Hash": current_hash
-							}
-						}
+		try:
+			# Prepare the GraphQL query
+			query_data = {
+				"operationName": "getUpcomingGroupEvents",
+				"variables": {
+					"urlname": group,
+					"afterDateTime": now.isoformat(),
+					"beforeDateTime": max_date.isoformat(),
+					"first": 50  # Limit to 50 events per group
+				},
+				"extensions": {
+					"persistedQuery": {
+						"version": 1,
+						"sha256Hash": query_hash
 					}
+				}
+			}
 
-					headers = {
-						"Content-Type": "application/json",
-						"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-					}
+			headers = {
+				"Content-Type": "application/json",
+				"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+			}
 
-					async with session.post(self.GQL_URL, json=query_data, headers=headers) as response:
-						if response.status == 200:
-							data = await response.json()
+			async with semaphore, request(session, "POST", self.GQL_URL, json=query_data, headers=headers) as response:
+				if response.status == 200:
+					data = await response.json(loads=orjson.loads)
+					
+					# Extract events from the GraphQL response
+					# Note: We'll need to adjust the path to events based on the actual response structure
+					#print(data)  # Debugging line to see the structure
+					if _hash_not_found(data):
+						# The hash was taken from the cache, iter_events discovers it again
+						self._rejected_groups.append(group)
+						return events
+					if "data" not in data or "groupByUrlname" not in data["data"] or "events" not in data["data"]["groupByUrlname"]:
+						logger.error("No events found for group %s in response: %s", group, data)
+						return events
+					group_events = data.get("data", {}).get("groupByUrlname", {}).get("events", []).get("edges", [])
+					
+					for event_data in group_events:
+						try:
+							node = event_data["node"]
+							start_time = self._parse_datetime(node["dateTime"])
 							
-							# Extract events from the GraphQL response
-							# Note: We'll need to adjust the path to events based on the actual response structure
-							#print(data)  # Debugging line to see the structure
-							if "data" not in data or "groupByUrlname" not in data["data"] or "events" not in data["data"]["groupByUrlname"]:
-								logger.error(f"No events found for group {group} in response: {data}")
+							# Skip if outside our date range, in case the query ignores the bounds
+							if start_time < now or start_time > max_date:
 								continue
-							group_events = data.get("data", {}).get("groupByUrlname", {}).get("events", []).get("edges", [])
 							
-							for event_data in group_events:
-								try:
-									node = event_data["node"]
-									start_time = self._parse_datetime(node["dateTime"].replace("Z", "+00:00"))
-									
-									# If event has duration, use it; otherwise default to 2 hours
-									duration_minutes = node.get("duration", 120)
-									end_time = start_time + timedelta(minutes=duration_minutes)
-
-									# Get venue information
-									venue = node.get("venue", {})
-									location = None
-									if venue:
-										address_parts = []
-										if venue.get("name"):
-											address_parts.append(venue["name"])
-										if venue.get("address"):
-											address_parts.append(venue["address"])
-										if venue.get("city"):
-											address_parts.append(venue["city"])
-										if venue.get("state"):
-											address_parts.append(venue["state"])
-										location = ", ".join(filter(None, address_parts))
-
-									event = Event(
-										title=node["title"],
-										start_time=start_time,
-										end_time=end_time,
-										description=node.get("description", ""),
-										location=location or "",
-										url=node.get("eventUrl"),
-										is_confirmed=False,  # Meetup events are considered un_confirmed
-										source=self.name(),
-										source_id=str(node.get("id"))
-									)
-									events.append(event)
-									#logger.info(f"Found Meetup event: {event.title} for group {group}")
-									
-								except (KeyError, ValueError) as e:
-									logger.error(f"Error parsing Meetup event for group {group}: {str(e)}")
-									continue
-						else:
-							response_text = await response.text()
-							logger.error(f"Meetup GraphQL request failed for group {group} with status {response.status}: {response_text}")
+							# If event has duration, use it; otherwise default to 2 hours
+							duration_minutes = node.get("duration", 120)
+							end_time = start_time + timedelta(minutes=duration_minutes)
+
+							# Get venue information
+							venue = node.get("venue", {})
+							location = None
+							if venue:
+								address_parts = []
+								if venue.get("name"):
+									address_parts.append(venue["name"])
+								if venue.get("address"):
+									address_parts.append(venue["address"])
+								if venue.get("city"):
+									address_parts.append(venue["city"])
+								if venue.get("state"):
+									address_parts.append(venue["state"])
+								location = ", ".join(filter(None, address_parts))
+
+							event = Event(
+								title=node["title"],
+								start_time=start_time,
+								end_time=end_time,
+								description=node.get("description", ""),
+								location=location or "",
+								url=node.get("eventUrl"),
+								is_confirmed=False,  # Meetup events are considered un_confirmed
+								source=self.name(),
+								source_id=str(node.get("id"))
+							)
+							events.append(event)
+							#logger.info(f"Found Meetup event: {event.title} for group {group}")
+							
+						except (KeyError, ValueError) as e:
+							logger.error("Error parsing Meetup event for group %s: %s", group, e)
+							continue
+				else:
+					response_text = await response.text()
+					logger.error("Meetup GraphQL request failed for group %s with status %s: %s", group, response.status, response_text)
 
+		except Exception:
+			logger.exception("Error fetching Meetup events for group %s", group)
+
+		return events
+
+	async def _fetch_groups(self, session: aiohttp.ClientSession, groups: List[str], query_hash: str, now: datetime, max_date: datetime) -> AsyncIterator[Event]:
+		"""Query the groups in parallel, a few at a time to stay clear of rate limits, and yield
+		each group's events as soon as it answers. Groups that rejected the query hash are
+		collected in self._rejected_groups."""
+		self._rejected_groups = []
+		semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+		tasks = [asyncio.create_task(self._fetch_group(session, semaphore, group, query_hash, now, max_date)) for group in groups]
+		try:
+			for next_done in asyncio.as_completed(tasks):
+				try:
+					result = await next_done
 				except Exception as e:
-					logger.error(f"Error fetching Meetup events for group {group}: {str(e)}")
-					logger.error(traceback.print_exc())
+					logger.error("Error fetching Meetup events: %s", e)
+					continue
+				for event in result:
+					yield event
+		finally:
+			for task in tasks:
+				task.cancel()
+
+	async def iter_events(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> AsyncIterator[Event]:
+		"""Yield events from Meetup.com GraphQL API."""
+		now = datetime.now(timezone.utc)
+		max_date = now + timedelta(days=days_ahead)
+		
+		# Get the current query hash, auto-discovering if needed
+		current_hash = await self._get_query_hash(session)
+		async for event in self._fetch_groups(session, MEETUP_GROUPS, current_hash, now, max_date):
+			yield event
 
-		return events 
\ No newline at end of file
+		if self._rejected_groups:
+			logger.warning("Meetup no longer knows the query hash, discovering it again")
+			current_hash = await self._get_query_hash(session, use_cache=False)
+			async for event in self._fetch_groups(session, self._rejected_groups, current_hash, now, max_date):
+				yield event
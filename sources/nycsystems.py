@@ -1,15 +1,28 @@
 import aiohttp
-from bs4 import BeautifulSoup
+import lxml.html
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import AsyncIterator
 import logging
+import os
 import re
 import zoneinfo
 
 from event_source import EventSource, Event
+from config import CACHE_DIR
+from _http_cache import HTTPCache
 
 logger = logging.getLogger(__name__)
 
+# Copy of the schedule page, only downloaded again when the site says it changed
+PAGE_CACHE_FILE = os.path.join(CACHE_DIR, "nycsystems.json")
+
+# The schedule always uses full English month names, looked up directly instead of going through strptime
+_MONTHS = {name: number for number, name in enumerate((
+	"january", "february", "march", "april", "may", "june",
+	"july", "august", "september", "october", "november", "december"
+), start=1)}
+_ET_ZONE = zoneinfo.ZoneInfo("America/New_York")
+
 class NYCSystemsEventSource(EventSource):
 	BASE_URL = "https://nycsystems.xyz"
 	DESCRIPTION = """NYC Systems is an independent tech talk series focused on systems programming. It is entirely community-run, not affiliated with any company.
@@ -31,100 +44,97 @@ Previous talks available at: https://youtube.com/@NYCSystems"""
 	def name(self) -> str:
 		return "nycsystems"
 
-	async def fetch_events(self, days_ahead: int = 90) -> List[Event]:
-		"""Fetch events from NYC Systems website."""
-		events = []
+	async def iter_events(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> AsyncIterator[Event]:
+		"""Yield events from NYC Systems website."""
 		now = datetime.now(timezone.utc)
 		
-		async with aiohttp.ClientSession() as session:
-			try:
-				# Fetch the main page
-				async with session.get(self.BASE_URL) as response:
-					if response.status == 200:
-						html = await response.text()
-						soup = BeautifulSoup(html, 'html.parser')
+		try:
+			# Fetch the main page, reusing the last copy if it has not changed
+			cache = HTTPCache(PAGE_CACHE_FILE)
+			html = await cache.get(session, self.BASE_URL)
+			if html is None:
+				return
+			cache.save()
+			root = lxml.html.fromstring(html)
+			
+			# Find the schedule table
+			schedule_table = next(iter(root.iter('table')), None)
+			if schedule_table is None:
+				logger.error("Could not find schedule table on NYC Systems page")
+				return
+
+			# Process each row in the schedule
+			for row in schedule_table.xpath('.//tr')[1:]:  # Skip header row
+				try:
+					columns = row.xpath('.//td')
+					if len(columns) < 2:
+						continue
+
+					# Extract date and speakers
+					date_cell = columns[0]
+					date_text = date_cell.text_content().strip()
+					speakers_text = columns[1].text_content().strip()
+					
+					# Parse the date (format: "Month DD")
+					try:
+						# Get the year from the URL or default to next occurrence
+						year = 2025  # Default to 2025 based on the website
+						
+						# Parse the month and day
+						month_name, day = date_text.split()
+						month = _MONTHS.get(month_name.lower())
+						if month is None:
+							raise ValueError(f"Unknown month in date {date_text!r}")
+						
+						# Create datetime in Eastern Time at 6:30 PM
+						start_time = datetime(
+							year, month, int(day),
+							hour=self.START_HOUR,
+							minute=self.START_MINUTE,
+							tzinfo=_ET_ZONE
+						)
+						
+						# Convert to UTC for storage
+						start_time = start_time.astimezone(timezone.utc)
 						
-						# Find the schedule table
-						schedule_table = soup.find('table')
-						if not schedule_table:
-							logger.error("Could not find schedule table on NYC Systems page")
-							return events
-
-						# Process each row in the schedule
-						for row in schedule_table.find_all('tr')[1:]:  # Skip header row
-							try:
-								columns = row.find_all('td')
-								if len(columns) < 2:
-									continue
-
-								# Extract date and speakers
-								date_cell = columns[0]
-								date_text = date_cell.text.strip()
-								speakers_text = columns[1].text.strip()
-								
-								# Parse the date (format: "Month DD")
-								try:
-									# Get the year from the URL or default to next occurrence
-									year = 2025  # Default to 2025 based on the website
-									
-									# Parse the month and day
-									date_str = f"{date_text} {year}"
-									naive_date = datetime.strptime(date_str, "%B %d %Y")
-									
-									# Create datetime in Eastern Time at 6:30 PM
-									et_zone = zoneinfo.ZoneInfo("America/New_York")
-									start_time = naive_date.replace(
-										hour=self.START_HOUR,
-										minute=self.START_MINUTE,
-										tzinfo=et_zone
-									)
-									
-									# Convert to UTC for storage
-									start_time = start_time.astimezone(timezone.utc)
-									
-									# Skip if event is in the past or too far in the future
-									if start_time < now or (start_time - now).days > days_ahead:
-										continue
-
-									# Set end time to 2 hours after start
-									end_time = start_time + timedelta(hours=self.DURATION_HOURS)
-
-									# Get event details link if available
-									event_link = None
-									link_elem = date_cell.find('a')
-									if link_elem and link_elem.get('href'):
-										event_link = f"{self.BASE_URL}{link_elem['href']}"
-
-									# Create title based on speakers
-									if speakers_text.lower() == 'tbd':
-										title = f"NYC Systems Talk - {date_text}"
-									else:
-										title = f"NYC Systems Talk - {speakers_text}"
-
-									event = Event(
-										title=title,
-										start_time=start_time,
-										end_time=end_time,
-										description=self.DESCRIPTION,
-										location=self.LOCATION,
-										url=event_link or self.BASE_URL,
-										is_confirmed=speakers_text.lower() != 'tbd',
-										source=self.name(),
-										source_id=f"nycsystems_{start_time.strftime('%Y%m%d')}"
-									)
-									events.append(event)
-									
-								except ValueError as e:
-									logger.error(f"Error parsing date for NYC Systems event: {str(e)}")
-									continue
-								
-							except Exception as e:
-								logger.error(f"Error processing NYC Systems event row: {str(e)}")
-								continue
-					else:
-						logger.error(f"NYC Systems website request failed with status {response.status}")
-
-			except Exception as e:
-				logger.error(f"Error fetching NYC Systems events: {str(e)}")
-
-		return events 
\ No newline at end of file
+						# Skip if event is in the past or too far in the future
+						if start_time < now or (start_time - now).days > days_ahead:
+							continue
+
+						# Set end time to 2 hours after start
+						end_time = start_time + timedelta(hours=self.DURATION_HOURS)
+
+						# Get event details link if available
+						event_link = None
+						links = date_cell.xpath('.//a/@href')
+						if links and links[0]:
+							event_link = f"{self.BASE_URL}{links[0]}"
+
+						# Create title based on speakers
+						if speakers_text.lower() == 'tbd':
+							title = f"NYC Systems Talk - {date_text}"
+						else:
+							title = f"NYC Systems Talk - {speakers_text}"
+
+						yield Event(
+							title=title,
+							start_time=start_time,
+							end_time=end_time,
+							description=self.DESCRIPTION,
+							location=self.LOCATION,
+							url=event_link or self.BASE_URL,
+							is_confirmed=speakers_text.lower() != 'tbd',
+							source=self.name(),
+							source_id=f"nycsystems_{start_time.strftime('%Y%m%d')}"
+						)
+						
+					except ValueError as e:
+						logger.error("Error parsing date for NYC Systems event: %s", e)
+						continue
+					
+				except Exception as e:
+					logger.error("Error processing NYC Systems event row: %s", e)
+					continue
+
+		except Exception as e:
+			logger.error("Error fetching NYC Systems events: %s", e)
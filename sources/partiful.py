@@ -1,60 +1,127 @@
-import aiohttp
+import aiohttp, asyncio, functools, hashlib, time
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple, Union
 import logging
 import json
+import orjson
 import os
-import uuid
+import random
 import base64
 from ics import Calendar
 from dotenv import load_dotenv, set_key
 from pathlib import Path
+from types import MappingProxyType
 
 from event_source import EventSource, Event
+from config import CACHE_DIR, FETCH_CONCURRENCY
+from _state import load_json, save_secret
+from _http_cache import HTTPCache
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Last ID token, reused by later runs until TOKEN_EXPIRY_MARGIN seconds before it expires
+TOKEN_FILE = os.path.join(CACHE_DIR, "partiful_token.json")
+TOKEN_EXPIRY_MARGIN = 5 * 60
+
+# ICS files of upcoming events, only downloaded again when Partiful's CDN says they changed
+ICS_CACHE_FILE = os.path.join(CACHE_DIR, "partiful_ics.json")
+
+@functools.lru_cache(maxsize=4096)
+def _parse_iso(date_str: str) -> datetime:
+	"""Parse an ISO 8601 timestamp, as UTC if it has no offset. Results are kept, since
+	events often share start and end times."""
+	# fromisoformat accepts a trailing 'Z' since 3.11
+	dt = datetime.fromisoformat(date_str)
+	if dt.tzinfo is None:
+		dt = dt.replace(tzinfo=timezone.utc)
+	return dt
+
+# Format of Partiful timestamps, e.g. 2025-03-01T23:00:00.000Z
+_ISO_UTC_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+
+def _token_owner(refresh_token: str) -> str:
+	"""Identify the refresh token a cached ID token was issued for, without storing it."""
+	return hashlib.blake2b(refresh_token.encode(), digest_size=16).hexdigest()
+
 class PartifulEventSource(EventSource):
 	API_URL = "https://api.partiful.com/getMyRsvps"
 	FIREBASE_TOKEN_URL = "https://securetoken.googleapis.com/v1/token"
 	FIREBASE_API_KEY = os.getenv('PARTIFUL_API_KEY')
 	FIREBASE_PROJECT_ID = "939741910890"
 	FIREBASE_APP_ID = "1:939741910890:web:5cca435c4b26209b8a7713"
+	__slots__ = ("refresh_token", "access_token", "id_token", "user_id", "_token_expiry", "_refresh_lock", "ics_files")
+
+	# Headers that are the same on every request, built once
+	_TOKEN_HEADERS = MappingProxyType({
+		"Accept-Language": "en-US",
+		"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.127 Safari/537.36",
+		"Content-Type": "application/x-www-form-urlencoded",
+		"X-Firebase-Gmpid": FIREBASE_APP_ID,
+		"X-Client-Version": "Chrome/JsCore/11.2.0/FirebaseCore-web",
+		"Origin": "https://partiful.com",
+		"Referer": "https://partiful.com/",
+		"Accept": "*/*"
+	})
+	_API_HEADERS = MappingProxyType({
+		"Content-Type": "application/json",
+		"Accept": "*/*",
+		"Accept-Language": "en-US,en;q=0.5",
+		"Origin": "https://partiful.com",
+		"Referer": "https://partiful.com/",
+		"DNT": "1",
+		"Sec-GPC": "1",
+		"Sec-Fetch-Dest": "empty",
+		"Sec-Fetch-Mode": "cors",
+		"Sec-Fetch-Site": "same-site",
+		"Cache-Control": "no-cache",
+		"Pragma": "no-cache"
+	})
 	
 	def __init__(self, ics_files: bool = False):
 		self.refresh_token = os.getenv('PARTIFUL_REFRESH_TOKEN')
+		if not self.refresh_token:
+			raise RuntimeError("PARTIFUL_REFRESH_TOKEN not found in environment variables")
+		if not self.FIREBASE_API_KEY:
+			raise RuntimeError("PARTIFUL_API_KEY not found in environment variables")
 		self.access_token = None
+		self.id_token = None
 		self.user_id = None
+		self._token_expiry = 0.0
 		self.ics_files = ics_files
-		if not self.refresh_token:
-			logger.error("PARTIFUL_REFRESH_TOKEN not found in environment variables")
-		if not self.FIREBASE_API_KEY:
-			logger.error("PARTIFUL_API_KEY not found in environment variables")
+		self._refresh_lock = asyncio.Lock()
+		self._load_token()
 
 	def name(self) -> str:
 		return "partiful"
 
 	def _generate_idempotency_key(self) -> str:
 		"""Generate a unique idempotency key."""
-		return str(uuid.uuid4().int % 9000000000000000000 + 1000000000000000000)
+		# 19 digits like the keys the web app sends, no need for a UUID's urandom read
+		return str(random.getrandbits(63) | (1 << 62))
+
+	def _load_token(self):
+		"""Pick up the ID token saved by a previous run, if it was issued for this refresh token."""
+		cached = load_json(TOKEN_FILE)
+		if cached.get("owner") == _token_owner(self.refresh_token):
+			self.id_token = cached.get("id_token")
+			self.user_id = cached.get("user_id")
+			self._token_expiry = cached.get("expires_at", 0.0)
+
+	async def _ensure_token(self, session: aiohttp.ClientSession, rejected: Optional[str] = None) -> bool:
+		"""Refresh the access token unless the current one is still valid for a while. A token
+		the API rejected is refreshed even if it has not expired yet."""
+		# Only one refresh at a time, the others wait for it and then reuse its token
+		async with self._refresh_lock:
+			if self.id_token and self.id_token != rejected and time.time() < self._token_expiry:
+				return True
+			return await self._refresh_token(session)
 
 	async def _refresh_token(self, session: aiohttp.ClientSession) -> bool:
 		"""Refresh the access token using Firebase Authentication."""
 		try:
-			headers = {
-				"Accept-Language": "en-US",
-				"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.6478.127 Safari/537.36",
-				"Content-Type": "application/x-www-form-urlencoded",
-				"X-Firebase-Gmpid": self.FIREBASE_APP_ID,
-				"X-Client-Version": "Chrome/JsCore/11.2.0/FirebaseCore-web",
-				"Origin": "https://partiful.com",
-				"Referer": "https://partiful.com/",
-				"Accept": "*/*"
-			}
-
 			data = {
 				"grant_type": "refresh_token",
 				"refresh_token": self.refresh_token
@@ -62,12 +129,19 @@ class PartifulEventSource(EventSource):
 
 			url = f"{self.FIREBASE_TOKEN_URL}?key={self.FIREBASE_API_KEY}"
 			
-			async with session.post(url, headers=headers, data=data) as response:
+			async with session.post(url, headers=self._TOKEN_HEADERS, data=data) as response:
 				if response.status == 200:
-					response_data = await response.json()
+					response_data = orjson.loads(await response.read())
 					self.access_token = response_data["access_token"]
 					self.id_token = response_data["id_token"]
 					self.user_id = response_data["user_id"]
+					self._token_expiry = time.time() + int(response_data.get("expires_in", 3600)) - TOKEN_EXPIRY_MARGIN
+					save_secret(TOKEN_FILE, {
+						"owner": _token_owner(self.refresh_token),
+						"id_token": self.id_token,
+						"user_id": self.user_id,
+						"expires_at": self._token_expiry
+					})
 					logger.info("Successfully refreshed Partiful access token")
 					return True
 				else:
@@ -81,261 +155,186 @@ class PartifulEventSource(EventSource):
 	def _parse_datetime(self, date_str: str) -> datetime:
 		"""Parse datetime string and ensure it's timezone-aware."""
 		try:
-			# Remove 'Z' and add UTC timezone
-			if date_str.endswith('Z'):
-				date_str = date_str[:-1] + '+00:00'
-			# Parse the string to datetime
-			dt = datetime.fromisoformat(date_str)
-			# If the datetime is naive, make it UTC
-			if dt.tzinfo is None:
-				dt = dt.replace(tzinfo=timezone.utc)
-			return dt
-		except Exception as e:
+			return _parse_iso(date_str)
+		except (TypeError, ValueError) as e:
 			logger.error(f"Error parsing datetime {date_str}: {str(e)}")
 			raise ValueError(f"Invalid datetime format: {date_str}")
 
-	async def fetch_events(self, days_ahead: int = 90):
+	async def iter_events(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> AsyncIterator[Union[Event, Calendar]]:
 		#Check if ics_files is enabled
 		if self.ics_files:
-			return await self.fetch_events_ics(days_ahead)
+			events = await self.fetch_events_ics(session, days_ahead)
 		else:
-			return await self.fetch_events_old(days_ahead)
+			events = await self.fetch_events_old(session, days_ahead)
+		for event in events:
+			yield event
 		
-	async def fetch_events_ics(self, days_ahead: int = 90) -> List[Calendar]:
+	def _has_passed(self, date_str: str, now: datetime, now_iso: str) -> bool:
+		"""Whether a start date is before now. Dates in Partiful's usual UTC format sort
+		like the times they stand for, so those are compared as strings without parsing."""
+		if isinstance(date_str, str) and len(date_str) == len(now_iso) and date_str.endswith("Z"):
+			return date_str < now_iso
+		return self._parse_datetime(date_str) < now
+
+	async def _download_ics(self, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore, cache: HTTPCache, event_id: str, ics_url: str) -> Optional[Calendar]:
+		"""Download and parse the ICS file of a single event, None if that fails."""
+		logger.info(f"Downloading calendar ICS file for event {event_id}")
+		try:
+			async with semaphore:
+				# ICS files are UTF-8 (RFC 5545), so skip aiohttp's charset detection
+				ics_content = await cache.get(session, ics_url, encoding="utf-8")
+			if ics_content is not None:
+				# Parse the ICS content in a worker thread, so the other downloads keep going meanwhile
+				return await asyncio.to_thread(Calendar, ics_content)
+		except Exception as e:
+			logger.error(f"Error downloading ICS file for event {event_id}: {str(e)}")
+		return None
+
+	async def _download_all_ics(self, session: aiohttp.ClientSession, downloads: List[Tuple[str, str]]) -> List[Calendar]:
+		"""Download the ICS files of (event ID, URL) pairs in parallel, a few at a time to go easy on Partiful's CDN.
+		Files that did not change since the last run are not downloaded again."""
+		semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+		cache = HTTPCache(ICS_CACHE_FILE)
+		results = await asyncio.gather(
+			*(self._download_ics(session, semaphore, cache, event_id, ics_url) for event_id, ics_url in downloads),
+			return_exceptions=True
+		)
+		cache.save()
+		calendars = []
+		for (event_id, _), result in zip(downloads, results):
+			if isinstance(result, BaseException):
+				logger.error(f"Error downloading ICS file for event {event_id}: {str(result)}")
+			elif result is not None:
+				calendars.append(result)
+		return calendars
+
+	async def _post_with_refresh(self, session: aiohttp.ClientSession, url: str, headers: dict, data: dict) -> dict:
+		"""POST to the Partiful API and return the decoded response, refreshing the token and
+		retrying once if it was rejected. Raises RuntimeError if the request still fails."""
+		async with session.post(url, headers=headers, json=data) as response:
+			if response.status == 200:
+				return orjson.loads(await response.read())
+			if response.status != 401:
+				response_text = await response.text()
+				raise RuntimeError(f"Partiful API request failed with status {response.status} and data {response_text}")
+
+		# Try to refresh token and retry the request once
+		logger.info("Token expired, attempting to refresh...")
+		if not await self._ensure_token(session, rejected=headers["Authorization"].removeprefix("Bearer ")):
+			raise RuntimeError("Failed to refresh token")
+		headers["Authorization"] = f"Bearer {self.id_token}"
+		async with session.post(url, headers=headers, json=data) as retry_response:
+			if retry_response.status == 200:
+				return orjson.loads(await retry_response.read())
+			raise RuntimeError(f"Failed to fetch events even after token refresh, status {retry_response.status}")
+
+	async def _fetch_rsvps(self, session: aiohttp.ClientSession) -> List[dict]:
+		"""Fetch the raw events the user has RSVP'd to."""
+		headers = {
+			**self._API_HEADERS,
+			"Authorization": f"Bearer {self.id_token}",
+			"Idempotency-Key": f'"{self._generate_idempotency_key()}"'
+		}
+
+		# Required JSON data structure
+		data = {
+			"data": {
+				"params": {},
+				"userId": self.user_id
+			}
+		}
+
+		response_data = await self._post_with_refresh(session, self.API_URL, headers, data)
+		# "or" also covers keys that are present but null
+		return ((response_data.get("result") or {}).get("data") or {}).get("events") or []
+
+	async def fetch_events_ics(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> List[Calendar]:
 		"""Fetch events from Partiful API and download ICS files."""
-		if not self.refresh_token or not self.FIREBASE_API_KEY:
-			logger.error("Cannot fetch Partiful events: Missing refresh token or API key")
+		# First make sure there is a valid access token
+		if not await self._ensure_token(session):
 			return []
 
-		events = []
-		
-		async with aiohttp.ClientSession() as session:
-			# First refresh the access token
-			if not await self._refresh_token(session):
-				return []
-			
-			events = []
-
-			try:
-				headers = {
-					"Authorization": f"Bearer {self.id_token}",
-					"Content-Type": "application/json",
-					"Accept": "*/*",
-					"Accept-Language": "en-US,en;q=0.5",
-					"Origin": "https://partiful.com",
-					"Referer": "https://partiful.com/",
-					"Idempotency-Key": f'"{self._generate_idempotency_key()}"',
-					"DNT": "1",
-					"Sec-GPC": "1",
-					"Sec-Fetch-Dest": "empty",
-					"Sec-Fetch-Mode": "cors",
-					"Sec-Fetch-Site": "same-site",
-					"Cache-Control": "no-cache",
-					"Pragma": "no-cache"
-				}
-
-				data = {
-					"data": {
-						"params": {},
-						"userId": self.user_id
-					}
-				}
-
-				async with session.post(self.API_URL, headers=headers, json=data) as response:
-					if response.status == 200:
-						data = await response.json()
-						now = datetime.now(timezone.utc)
-						
-						for event_data in data.get("result", {}).get("data", {}).get("events", []):
-							# Check to see if the event has passed
-							if "startDate" in event_data:
-								try:
-									# Parse start date with timezone handling
-									start_time = self._parse_datetime(event_data["startDate"])
-									if start_time < now:
-										#logger.info(f"Skipping past event {event_data['id']} with start time {start_time}")
-										continue
-								except ValueError as e:
-									logger.error(f"Error parsing start date for event {event_data['id']}: {str(e)}")
-									continue
-							else:
-								logger.warning(f"Event {event_data['id']} does not have a start date, skipping")
-								continue
-
-							#logger.info(f"Processing event {event_data}")
-							if event_data.get("calendarFile"):
-								logger.info(f"Downloading calendar ICS file for event {event_data['id']}")
-								try:
-									ics_url = event_data["calendarFile"]
-									async with session.get(ics_url) as ics_response:
-										if ics_response.status == 200:
-											ics_content = await ics_response.text()
-											# Parse the ICS content
-											calendar = Calendar(ics_content)
-											events.append(calendar)
-
-								except Exception as e:
-									logger.error(f"Error downloading ICS file for event {event_data['id']}: {str(e)}")
-									continue
-							else:
-								logger.warning(f"No calendar URL found for event {event_data['id']}, skipping ICS download")
-								continue
-				
-					elif response.status == 401:
-						# Try to refresh token and retry the request once
-						logger.info("Token expired, attempting to refresh...")
-						if await self._refresh_token(session):
-							# Retry the request with new token
-							headers["Authorization"] = f"Bearer {self.id_token}"
-							async with session.post(self.API_URL, headers=headers, json=data) as retry_response:
-								if retry_response.status == 200:
-									retry_data = await retry_response.json()
-									# Process events (same code as above)
-									for event_data in retry_data.get("result", {}).get("data", {}).get("events", []):
-										if event_data.get("calendarUrl"):
-											logger.info(f"Downloading calendar ICS file for event {event_data['id']}")
-											try:
-												ics_url = event_data["calendarUrl"]
-												async with session.get(ics_url) as ics_response:
-													if ics_response.status == 200:
-														ics_content = await ics_response.text()
-														calendar = Calendar(ics_content)
-														events.append(calendar)
-											except Exception as e:
-												logger.error(f"Error downloading ICS file for event {event_data['id']}: {str(e)}")
-												continue
-								else:
-									logger.error("Failed to fetch events even after token refresh")
-						else:
-							logger.error("Failed to refresh token")
-					else:
-						response_text = await response.text()
-						logger.error(f"Partiful API request failed with status {response.status} and data {response_text}")
-			except Exception as e:
-				logger.error(f"Error fetching Partiful events: {str(e)}")
-		return events
+		try:
+			now = datetime.now(timezone.utc)
+			now_iso = now.strftime(_ISO_UTC_FORMAT)
+			downloads = []
+
+			for event_data in await self._fetch_rsvps(session):
+				# Check to see if the event has passed
+				if "startDate" in event_data:
+					try:
+						if self._has_passed(event_data["startDate"], now, now_iso):
+							#logger.info(f"Skipping past event {event_data['id']} with start time {event_data['startDate']}")
+							continue
+					except ValueError as e:
+						logger.error(f"Error parsing start date for event {event_data['id']}: {str(e)}")
+						continue
+				else:
+					logger.warning(f"Event {event_data['id']} does not have a start date, skipping")
+					continue
+
+				#logger.info(f"Processing event {event_data}")
+				if event_data.get("calendarFile"):
+					downloads.append((event_data["id"], event_data["calendarFile"]))
+				else:
+					logger.warning(f"No calendar URL found for event {event_data['id']}, skipping ICS download")
+					continue
+
+			return await self._download_all_ics(session, downloads)
+		except Exception as e:
+			logger.error(f"Error fetching Partiful events: {str(e)}")
+			return []
 	
 	
-	async def fetch_events_old(self, days_ahead: int = 90) -> List[Event]:
+	def _to_event(self, event_data: dict, now: datetime, now_iso: str) -> Optional[Event]:
+		"""Build the Event for an upcoming RSVP, None if it has passed or cannot be parsed."""
+		try:
+			# Skip events that have already happened
+			if self._has_passed(event_data["startDate"], now, now_iso):
+				return None
+			
+			# Parse start date with timezone handling
+			start_time = self._parse_datetime(event_data["startDate"])
+			
+			# Handle end date (default to 3 hours if not specified)
+			if event_data.get("endDate"):
+				end_time = self._parse_datetime(event_data["endDate"])
+			else:
+				end_time = start_time + timedelta(hours=3)
+			
+			# Create Event object
+			return Event(
+				title=event_data["title"],
+				start_time=start_time,
+				end_time=end_time,
+				description=event_data.get("description", ""),
+				location=event_data.get("location", ""),
+				url=f"https://partiful.com/e/{event_data['id']}",
+				is_confirmed=(event_data.get("guest") or {}).get("status") == "GOING",
+				source=self.name(),
+				source_id=event_data["id"]
+			)
+			
+		except (KeyError, ValueError) as e:
+			logger.error(f"Error parsing Partiful event: {str(e)}")
+			return None
+
+	async def fetch_events_old(self, session: aiohttp.ClientSession, days_ahead: int = 90) -> List[Event]:
 		"""Fetch events from Partiful API."""
-		if not self.refresh_token or not self.FIREBASE_API_KEY:
-			logger.error("Cannot fetch Partiful events: Missing refresh token or API key")
+		# First make sure there is a valid access token
+		if not await self._ensure_token(session):
 			return []
 
-		events = []
-		
-		async with aiohttp.ClientSession() as session:
-			# First refresh the access token
-			if not await self._refresh_token(session):
-				return []
-
-			try:
-				headers = {
-					"Authorization": f"Bearer {self.id_token}",
-					"Content-Type": "application/json",
-					"Accept": "*/*",
-					"Accept-Language": "en-US,en;q=0.5",
-					"Origin": "https://partiful.com",
-					"Referer": "https://partiful.com/",
-					"Idempotency-Key": f'"{self._generate_idempotency_key()}"',
-					"DNT": "1",
-					"Sec-GPC": "1",
-					"Sec-Fetch-Dest": "empty",
-					"Sec-Fetch-Mode": "cors",
-					"Sec-Fetch-Site": "same-site",
-					"Cache-Control": "no-cache",
-					"Pragma": "no-cache"
-				}
-
-				# Required JSON data structure
-				data = {
-					"data": {
-						"params": {},
-						"userId": self.user_id
-					}
-				}
-
-				async with session.post(self.API_URL, headers=headers, json=data) as response:
-					if response.status == 200:
-						data = await response.json()
-						now = datetime.now(timezone.utc)
-						
-						# Process each event from the API response
-						for event_data in data.get("result", {}).get("data", {}).get("events", []):
-							try:
-								# Parse start date with timezone handling
-								start_time = self._parse_datetime(event_data["startDate"])
-								
-								# Skip events that have already happened
-								if start_time < now:
-									continue
-								
-								# Handle end date (default to 3 hours if not specified)
-								if event_data.get("endDate"):
-									end_time = self._parse_datetime(event_data["endDate"])
-								else:
-									end_time = start_time + timedelta(hours=3)
-								
-								# Create Event object
-								event = Event(
-									title=event_data["title"],
-									start_time=start_time,
-									end_time=end_time,
-									description=event_data.get("description", ""),
-									location=event_data.get("location", ""),
-									url=f"https://partiful.com/e/{event_data['id']}",
-									is_confirmed=event_data.get("guest", {}).get("status") == "GOING",
-									source=self.name(),
-									source_id=event_data["id"]
-								)
-								events.append(event)
-								
-							except (KeyError, ValueError) as e:
-								logger.error(f"Error parsing Partiful event: {str(e)}")
-								continue
-					elif response.status == 401:
-						# Try to refresh token and retry the request once
-						logger.info("Token expired, attempting to refresh...")
-						if await self._refresh_token(session):
-							# Retry the request with new token
-							headers["Authorization"] = f"Bearer {self.id_token}"
-							async with session.post(self.API_URL, headers=headers, json=data) as retry_response:
-								if retry_response.status == 200:
-									retry_data = await retry_response.json()
-									# Process events (same code as above)
-									for event_data in retry_data.get("result", {}).get("data", {}).get("events", []):
-										try:
-											start_time = self._parse_datetime(event_data["startDate"])
-											if start_time < now:
-												continue
-											if event_data.get("endDate"):
-												end_time = self._parse_datetime(event_data["endDate"])
-											else:
-												end_time = start_time + timedelta(hours=3)
-											event = Event(
-												title=event_data["title"],
-												start_time=start_time,
-												end_time=end_time,
-												description=event_data.get("description", ""),
-												location=event_data.get("location", ""),
-												url=f"https://partiful.com/e/{event_data['id']}",
-												is_confirmed=event_data.get("guest", {}).get("status") == "GOING",
-												source=self.name(),
-												source_id=event_data["id"]
-											)
-											events.append(event)
-										except (KeyError, ValueError) as e:
-											logger.error(f"Error parsing Partiful event after token refresh: {str(e)}")
-											continue
-								else:
-									logger.error("Failed to fetch events even after token refresh")
-						else:
-							logger.error("Failed to refresh token")
-					else:
-						response_text = await response.text()
-						logger.error(f"Partiful API request failed with status {response.status} and data {response_text}")
-
-			except Exception as e:
-				logger.error(f"Error fetching Partiful events: {str(e)}")
-
-		return events 
\ No newline at end of file
+		try:
+			now = datetime.now(timezone.utc)
+			now_iso = now.strftime(_ISO_UTC_FORMAT)
+			
+			# Process each event from the API response in one pass
+			return [
+				event for event_data in await self._fetch_rsvps(session)
+				if (event := self._to_event(event_data, now, now_iso)) is not None
+			]
+
+		except Exception as e:
+			logger.error(f"Error fetching Partiful events: {str(e)}")
+			return []